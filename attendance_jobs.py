@@ -0,0 +1,192 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from contextlib import closing
+
+
+class QueueFull(Exception):
+    pass
+
+
+# Restart-safe job queue stored in a local SQLite file. Jobs are grouped by a
+# key (e.g. teacher and subject) so each classroom can only have a few pending jobs.
+class JobQueue:
+    def __init__(self, path, handler, workers=2, max_pending=3, retention=3600, stale_after=120):
+        self.path = path
+        self.handler = handler  # callable(payload dict) -> result dict
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retention = retention  # seconds finished jobs are kept for polling
+        self.stale_after = stale_after  # seconds before a running job is assumed lost and re-queued
+        self._threads = []
+        self._wakeup = threading.Condition()
+        self._started = False
+        self._lock = threading.Lock()
+        self._created = False
+
+    # The database file and table are created on first use, so constructing a
+    # queue (e.g. when the app module is imported) touches no files
+    def _create(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with closing(self._open()) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    key TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status)")
+        self._created = True
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"attendance-job-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, key, payload, job_id=None):
+        self.start()
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE key = ? AND status IN ('queued', 'running')", (key,)
+            ).fetchone()[0]
+            if pending >= self.max_pending:
+                conn.execute("ROLLBACK")
+                raise QueueFull(f"Too many pending jobs ({pending}), try again shortly")
+            conn.execute(
+                "INSERT INTO jobs (id, key, status, payload, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, key, json.dumps(payload), now, now)
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT id, status, result, error, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if not row:
+            return None
+        job = {
+            "job_id": row[0],
+            "status": row[1],
+            "created_at": row[4],
+            "updated_at": row[5]
+        }
+        if row[2] is not None:
+            job["result"] = json.loads(row[2])
+        if row[3] is not None:
+            job["error"] = row[3]
+        if row[1] == "queued":
+            job["position"] = self._position(row[4])
+        return job
+
+    def stats(self):
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def _position(self, created_at):
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at < ?", (created_at,)
+            ).fetchone()[0]
+
+    def _claim(self):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Jobs left running by a process that stopped are picked up again
+            conn.execute(
+                "UPDATE jobs SET status = 'queued' WHERE status = 'running' AND updated_at < ?",
+                (time.time() - self.stale_after,)
+            )
+            row = conn.execute(
+                "SELECT id, payload FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ?", (time.time(), row[0])
+                )
+            conn.execute("COMMIT")
+            return (row[0], json.loads(row[1])) if row else None
+        finally:
+            conn.close()
+
+    def _finish(self, job_id, result=None, error=None):
+        with closing(self._connect()) as conn:
+            # Frames are dropped once a job is done, only the result is kept for polling
+            conn.execute(
+                "UPDATE jobs SET status = ?, payload = NULL, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                ("failed" if error else "done", json.dumps(result) if result is not None else None,
+                 error, time.time(), job_id)
+            )
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - self.retention,)
+            )
+
+    def _work(self):
+        while True:
+            job = self._claim()
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=1.0)
+                continue
+
+            job_id, payload = job
+            # Keep long jobs from being taken for lost and re-queued while they run
+            running = threading.Event()
+            heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, running), daemon=True)
+            heartbeat.start()
+            try:
+                self._finish(job_id, result=self.handler(payload))
+            except Exception as e:
+                traceback.print_exc()
+                self._finish(job_id, error=str(e))
+            finally:
+                running.set()
+
+    def _heartbeat(self, job_id, done):
+        while not done.wait(self.stale_after / 3):
+            with closing(self._connect()) as conn:
+                conn.execute(
+                    "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = 'running'", (time.time(), job_id)
+                )
+
+    def _connect(self):
+        if not self._created:
+            with self._lock:
+                if not self._created:
+                    self._create()
+        return self._open()
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
@@ -0,0 +1,153 @@
+import threading
+import time
+import traceback
+
+
+# A live camera-mode attendance session for one subject, date and teacher. It holds
+# the class gallery, the students already marked present and the roster still
+# unseen. Each batch is matched against the whole class and matches to students
+# already present are dropped, so a face seen before is never reassigned to an
+# unseen lookalike. Present marks are buffered and written in coalesced flushes;
+# closing the session flushes them and marks every unseen student of the roster
+# absent in one bulk write.
+class AttendanceSession:
+    def __init__(self, key, gallery, roster, writer, present=(), flush_interval=2.0):
+        self.key = key
+        self.gallery = gallery
+        self.roster = roster  # {student_id: student} of the whole class
+        self.writer = writer  # callable(records, students, overwrite) -> {student_id: outcome}
+        self.flush_interval = flush_interval
+        self.present = set(present)
+        self.pending = {}  # student_id -> student, present marks not yet written
+        self.batches = 0
+        self.flushes = 0
+        self.started_at = time.time()
+        self.last_used = time.monotonic()
+        self.closed = False
+        self._timer = None
+        self._lock = threading.RLock()
+
+    # The class gallery a batch is matched against, and the students already
+    # present whose matches the batch drops
+    def begin_batch(self):
+        with self._lock:
+            self.last_used = time.monotonic()
+            self.batches += 1
+            return self.gallery, frozenset(self.present)
+
+    # Buffer present marks; returns the student_ids that were not present yet, or
+    # None if the session was closed in the meantime
+    def mark_present(self, students):
+        with self._lock:
+            if self.closed:
+                return None
+            new = [sid for sid in students if sid not in self.present]
+            if not new:
+                return []
+            for sid in new:
+                self.present.add(sid)
+                self.pending[sid] = students[sid]
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush_later)
+                self._timer.daemon = True
+                self._timer.start()
+            return new
+
+    # Write the buffered present marks in one bulk upsert
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self.pending:
+                return 0
+            pending = self.pending
+            self.pending = {}
+            try:
+                self.writer([(sid, "present") for sid in pending], pending, True)
+            except Exception:
+                # Keep the marks for the next flush
+                pending.update(self.pending)
+                self.pending = pending
+                raise
+            self.flushes += 1
+            return len(pending)
+
+    def _flush_later(self):
+        try:
+            self.flush()
+        except Exception:
+            traceback.print_exc()
+
+    # Flush and mark the unseen roster absent; existing records (e.g. marked by
+    # hand during the session) are left untouched
+    def close(self):
+        with self._lock:
+            self.flush()
+            absent = {sid: student for sid, student in self.roster.items() if sid not in self.present}
+            outcome = self.writer([(sid, "absent") for sid in absent], absent, False) if absent else {}
+            self.closed = True
+            status = self.status()
+            status["marked_absent"] = sum(1 for result in outcome.values() if result == "inserted")
+            return status
+
+    def status(self):
+        with self._lock:
+            return {
+                "session": self.key,
+                "started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started_at)),
+                "roster": len(self.roster),
+                "present": len(self.present),
+                "remaining": len(self.roster) - len(self.present & set(self.roster)),
+                "pending_writes": len(self.pending),
+                "batches": self.batches,
+                "flushes": self.flushes,
+                "closed": self.closed
+            }
+
+
+# Open sessions keyed by "teacher_id:subject_id:date". Sessions idle for longer
+# than idle_timeout seconds are closed (and finalized) on the next access.
+class SessionRegistry:
+    def __init__(self, idle_timeout=4 * 3600.0):
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    # Return the open session for key, creating it with factory() if there is none.
+    # Returns (session, created).
+    def start(self, key, factory):
+        self._expire()
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                return session, False
+            session = self._sessions[key] = factory()
+            return session, True
+
+    def get(self, key):
+        self._expire()
+        with self._lock:
+            return self._sessions.get(key)
+
+    # Close and remove a session; returns its final status or None if it wasn't open
+    def stop(self, key):
+        with self._lock:
+            session = self._sessions.get(key)
+        if session is None:
+            return None
+        status = session.close()
+        with self._lock:
+            if self._sessions.get(key) is session:
+                del self._sessions[key]
+        return status
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [key for key, session in self._sessions.items() if session.last_used < cutoff]
+        for key in idle:
+            try:
+                self.stop(key)
+            except Exception:
+                traceback.print_exc()
@@ -0,0 +1,225 @@
+import base64
+import datetime
+import json
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+
+STUDENT_FIELDS = {"_id": 0, "student_id": 1, "name": 1, "course": 1, "class_year": 1, "division": 1}
+
+
+# Load the students of a batch with a single $in query, keyed by student_id
+def load_students(students_collection, student_ids):
+    if not student_ids:
+        return {}
+    return {
+        student["student_id"]: student
+        for student in students_collection.find({"student_id": {"$in": list(student_ids)}}, STUDENT_FIELDS)
+    }
+
+
+# Write the statuses of one subject and date as a single unordered bulk upsert keyed
+# on (student_id, subject_id, date). records is a list of (student_id, status);
+# students may hold already loaded student docs to skip the lookup. When a
+# summary is given, the previous statuses are read first so its counters can be
+# updated incrementally. With overwrite=False only missing records are created
+# and existing statuses are left as they are.
+# Returns {student_id: "inserted" | "updated" | "exists" | "not_found"}.
+def write_attendance(attendance_collection, students_collection, subject, attendance_date, records,
+                     marked_by, students=None, summary=None, overwrite=True):
+    # The last status given for a student wins
+    statuses = dict(records)
+    students = dict(students or {})
+    missing = [student_id for student_id in statuses if student_id not in students]
+    students.update(load_students(students_collection, missing))
+
+    outcome = {}
+    operations = []
+    op_students = []
+    now = datetime.datetime.now()
+    for student_id, status in statuses.items():
+        student = students.get(student_id)
+        if not student:
+            outcome[student_id] = "not_found"
+            continue
+
+        status_fields = {
+            "status": status,
+            "updated_at": now,
+            "updated_by": marked_by
+        }
+        insert_fields = {
+            "student_name": student["name"],
+            "subject_name": subject["name"],
+            "course": student["course"],
+            "class_year": student["class_year"],
+            "division": student["division"],
+            "created_at": now,
+            "marked_by": marked_by
+        }
+        if overwrite:
+            update = {"$set": status_fields, "$setOnInsert": insert_fields}
+        else:
+            update = {"$setOnInsert": dict(insert_fields, **status_fields)}
+
+        operations.append(UpdateOne(
+            {"student_id": student_id, "subject_id": subject["subject_id"], "date": attendance_date},
+            update,
+            upsert=True
+        ))
+        op_students.append(student_id)
+
+    if not operations:
+        return outcome
+
+    previous = {}
+    if summary is not None and overwrite:
+        previous = {
+            record["student_id"]: record["status"]
+            for record in attendance_collection.find(
+                {"student_id": {"$in": op_students}, "subject_id": subject["subject_id"], "date": attendance_date},
+                {"_id": 0, "student_id": 1, "status": 1}
+            )
+        }
+
+    result = attendance_collection.bulk_write(operations, ordered=False)
+    for i, student_id in enumerate(op_students):
+        outcome[student_id] = "inserted" if i in result.upserted_ids else "updated" if overwrite else "exists"
+
+    if summary is not None:
+        # A row updated without a previous status was created by a concurrent
+        # writer after the read above, which already counted it
+        summary.apply(subject["subject_id"], attendance_date, [
+            (student_id,
+             None if outcome[student_id] == "inserted" else previous.get(student_id, statuses[student_id]),
+             statuses[student_id])
+            for student_id in op_students
+            if outcome[student_id] != "exists"
+        ])
+    return outcome
+
+
+
+# Create the attendance sheet of a subject and date: an "absent" row for every
+# student of the subject's course and class year, in one unordered bulk upsert.
+# Existing rows are left as they are, so it is safe to repeat, and marking a
+# student present afterwards only updates the status of their row.
+# Returns (students on the roster, rows created).
+def open_day_sheet(attendance_collection, students_collection, subject, attendance_date, marked_by, summary=None):
+    roster = {
+        student["student_id"]: student
+        for student in students_collection.find(
+            {"course": subject["course"], "class_year": subject["class_year"]}, STUDENT_FIELDS)
+    }
+    outcome = write_attendance(attendance_collection, students_collection, subject, attendance_date,
+                               [(student_id, "absent") for student_id in roster], marked_by,
+                               students=roster, summary=summary, overwrite=False)
+    return len(roster), sum(1 for result in outcome.values() if result == "inserted")
+
+ROSTER_HIDDEN_FIELDS = ["_id", "password", "face_encoding", "face_encodings", "attendance"]
+
+
+# Roster of a division and its students' attendance for a subject's dates, in two
+# queries: the students, then their records with one $in query on the
+# (student_id, subject_id, date) index. Returns (roster, {student_id: [records]}).
+# A $lookup would need MongoDB 5.0 to join on a field and filter in the same
+# stage, and mongomock does not implement it.
+def _roster_attendance(students_collection, attendance_collection, course, class_year, division, subject_id,
+                       date_match, projection, attendance_fields):
+    roster = list(students_collection.find({"course": course, "class_year": class_year, "division": division},
+                                           projection))
+    records = {}
+    if roster:
+        for record in attendance_collection.find(
+            {"student_id": {"$in": [student["student_id"] for student in roster]},
+             "subject_id": subject_id, "date": date_match},
+            dict({"_id": 0, "student_id": 1}, **{field: 1 for field in attendance_fields})
+        ):
+            records.setdefault(record["student_id"], []).append(record)
+    return roster, records
+
+
+# Roster with the status of every student for one subject and date
+def roster_with_status(students_collection, attendance_collection, course, class_year, division, subject_id,
+                       attendance_date):
+    roster, records = _roster_attendance(students_collection, attendance_collection, course, class_year, division,
+                                         subject_id, attendance_date,
+                                         {field: 0 for field in ROSTER_HIDDEN_FIELDS}, ["status"])
+    for student in roster:
+        # Students without an attendance record default to absent
+        student["status"] = records.get(student["student_id"], [{"status": "absent"}])[0]["status"]
+    return roster
+
+
+# Students x dates attendance matrix over a date range, in columnar form:
+# status[i][j] is 1 (present), 0 (absent) or None (no record) for student i on dates[j]
+def roster_attendance_matrix(students_collection, attendance_collection, course, class_year, division, subject_id,
+                             start_date, end_date):
+    roster, records = _roster_attendance(students_collection, attendance_collection, course, class_year, division,
+                                         subject_id, {"$gte": start_date, "$lte": end_date},
+                                         {"_id": 0, "student_id": 1, "name": 1}, ["date", "status"])
+    roster.sort(key=lambda student: student["student_id"])
+
+    dates = sorted({record["date"] for student_records in records.values() for record in student_records})
+    columns = {date: j for j, date in enumerate(dates)}
+    status = []
+    for student in roster:
+        row = [None] * len(dates)
+        for record in records.get(student["student_id"], []):
+            row[columns[record["date"]]] = 1 if record["status"] == "present" else 0
+        status.append(row)
+
+    return {
+        "student_ids": [student["student_id"] for student in roster],
+        "names": [student.get("name") for student in roster],
+        "dates": [date.strftime("%Y-%m-%d") for date in dates],
+        "status": status
+    }
+
+
+# Fields returned by GET /api/attendance
+ATTENDANCE_FIELDS = ["student_id", "subject_id", "subject_name", "division", "status", "date",
+                     "marked_by", "updated_at", "updated_by"]
+
+
+# Convert datetime objects to strings only if they are not already strings
+def format_attendance_record(record):
+    record.pop("_id", None)
+    if "date" in record and isinstance(record["date"], datetime.datetime):
+        record["date"] = record["date"].strftime("%Y-%m-%d")
+
+    if "created_at" in record and isinstance(record["created_at"], datetime.datetime):
+        record["created_at"] = record["created_at"].strftime("%Y-%m-%d %H:%M:%S")
+
+    if "updated_at" in record and isinstance(record["updated_at"], datetime.datetime):
+        record["updated_at"] = record["updated_at"].strftime("%Y-%m-%d %H:%M:%S")
+    return record
+
+
+# Keyset pagination over (date, _id) descending. The cursor is an opaque token
+# holding the sort key of the last record of a page.
+def encode_cursor(record):
+    date = record.get("date")
+    token = {
+        "id": str(record["_id"]),
+        "date": date.isoformat() if isinstance(date, datetime.datetime) else date,
+        "str": isinstance(date, str)
+    }
+    return base64.urlsafe_b64encode(json.dumps(token).encode()).decode()
+
+
+def cursor_filter(cursor):
+    token = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    last_id = ObjectId(token["id"])
+    if token["str"]:
+        date = token["date"]
+        return {"$or": [{"date": {"$lt": date}}, {"date": date, "_id": {"$lt": last_id}}]}
+
+    date = datetime.datetime.fromisoformat(token["date"])
+    # Legacy string dates sort below every datetime, so they follow the last datetime page
+    return {"$or": [
+        {"date": {"$lt": date}},
+        {"date": date, "_id": {"$lt": last_id}},
+        {"date": {"$type": "string"}}
+    ]}
@@ -0,0 +1,121 @@
+import datetime
+
+from pymongo import UpdateOne
+
+
+STUDENT_SUMMARY = "attendance_summary_student"
+DAILY_SUMMARY = "attendance_summary_daily"
+
+
+def _as_date(date):
+    # mark_all_absent historically stored dates as YYYY-MM-DD strings
+    if isinstance(date, str):
+        return datetime.datetime.strptime(date, "%Y-%m-%d")
+    return date
+
+
+def _with_percentage(summary):
+    summary["percentage"] = round(100.0 * summary["present"] / summary["total"], 2) if summary["total"] else 0.0
+    return summary
+
+
+# Present/total counters per (student, subject) and per (subject, date), kept up
+# to date by every attendance write so summaries are answered without scanning
+# the attendance history.
+class AttendanceSummary:
+    def __init__(self, db):
+        self.db = db
+
+    # changes is a list of (student_id, previous_status or None for a new record, new_status)
+    def apply(self, subject_id, date, changes):
+        date = _as_date(date)
+        operations = []
+        daily_present = 0
+        daily_total = 0
+        for student_id, previous, status in changes:
+            present = (status == "present") - (previous == "present")
+            total = 1 if previous is None else 0
+            if not present and not total:
+                continue
+            operations.append(UpdateOne(
+                {"student_id": student_id, "subject_id": subject_id},
+                {"$inc": {"present": present, "total": total}},
+                upsert=True
+            ))
+            daily_present += present
+            daily_total += total
+
+        if operations:
+            self.db[STUDENT_SUMMARY].bulk_write(operations, ordered=False)
+            self.db[DAILY_SUMMARY].update_one(
+                {"subject_id": subject_id, "date": date},
+                {"$inc": {"present": daily_present, "total": daily_total}},
+                upsert=True
+            )
+
+    def for_student(self, student_id, subject_id=None):
+        query = {"student_id": student_id}
+        if subject_id:
+            query["subject_id"] = subject_id
+        return [_with_percentage(s) for s in self.db[STUDENT_SUMMARY].find(query, {"_id": 0})]
+
+    def for_subject(self, subject_id):
+        return [_with_percentage(s) for s in self.db[STUDENT_SUMMARY].find({"subject_id": subject_id}, {"_id": 0})]
+
+    def daily(self, subject_id, start_date=None, end_date=None):
+        query = {"subject_id": subject_id}
+        if start_date or end_date:
+            query["date"] = {}
+            if start_date:
+                query["date"]["$gte"] = start_date
+            if end_date:
+                query["date"]["$lte"] = end_date
+        summaries = []
+        for summary in self.db[DAILY_SUMMARY].find(query, {"_id": 0}).sort("date", 1):
+            summary["date"] = summary["date"].strftime("%Y-%m-%d")
+            summaries.append(_with_percentage(summary))
+        return summaries
+
+    # Recompute both summaries from the attendance collection (backfill or repair)
+    def rebuild(self):
+        present = {"$sum": {"$cond": [{"$eq": ["$status", "present"]}, 1, 0]}}
+        students = self.db["attendance"].aggregate([
+            {"$group": {"_id": {"student_id": "$student_id", "subject_id": "$subject_id"},
+                        "present": present, "total": {"$sum": 1}}}
+        ], allowDiskUse=True)
+        days = self.db["attendance"].aggregate([
+            {"$group": {"_id": {"subject_id": "$subject_id", "date": "$date"},
+                        "present": present, "total": {"$sum": 1}}}
+        ], allowDiskUse=True)
+
+        student_docs = [dict(row["_id"], present=row["present"], total=row["total"]) for row in students]
+
+        # String and datetime dates of the same day collapse into one entry
+        daily = {}
+        for row in days:
+            key = (row["_id"]["subject_id"], _as_date(row["_id"]["date"]))
+            counts = daily.setdefault(key, {"present": 0, "total": 0})
+            counts["present"] += row["present"]
+            counts["total"] += row["total"]
+        daily_docs = [dict(subject_id=subject_id, date=date, **counts) for (subject_id, date), counts in daily.items()]
+
+        for name, docs in [(STUDENT_SUMMARY, student_docs), (DAILY_SUMMARY, daily_docs)]:
+            self.db[name].delete_many({})
+            if docs:
+                self.db[name].insert_many(docs, ordered=False)
+        return len(student_docs), len(daily_docs)
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    from db import mongo
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Rebuild the attendance summaries from the attendance records")
+    parser.add_argument("command", choices=["rebuild"])
+    args = parser.parse_args()
+
+    student_count, daily_count = AttendanceSummary(mongo.db).rebuild()
+    print(f"Rebuilt {student_count} student/subject summaries and {daily_count} daily summaries")
@@ -0,0 +1,100 @@
+# Count MongoDB round trips and time for marking a class, comparing the old
+# per-student find_one + update/insert loop with the bulk upsert write layer.
+#
+#   python benchmarks/bench_attendance_writes.py --students 100
+#   python benchmarks/bench_attendance_writes.py --uri mongodb://localhost:27017
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attendance_store import write_attendance
+
+ROUND_TRIP_METHODS = {"find", "find_one", "update_one", "insert_one", "insert_many", "bulk_write", "aggregate"}
+
+
+# Wraps a collection and counts every call that reaches the server
+class CountingCollection:
+    def __init__(self, collection, counter):
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in ROUND_TRIP_METHODS:
+            def counted(*args, **kwargs):
+                self._counter[name] = self._counter.get(name, 0) + 1
+                return attr(*args, **kwargs)
+            return counted
+        return attr
+
+
+def connect(uri):
+    if uri:
+        import pymongo
+        return pymongo.MongoClient(uri)["attendance_benchmark"]
+    import mongomock
+    return mongomock.MongoClient()["attendance_benchmark"]
+
+
+def seed(db, count):
+    db.students.delete_many({})
+    db.attendance.delete_many({})
+    db.students.insert_many([{
+        "student_id": f"S{i:05d}", "name": f"Student {i}", "course": "BSC IT",
+        "class_year": "FY", "division": "A"
+    } for i in range(count)])
+    return {"subject_id": "B001", "name": "Benchmark", "course": "BSC IT", "class_year": "FY"}
+
+
+# The per-student loop every attendance endpoint used before the write layer
+def legacy_write(attendance, students, subject, date, records, marked_by):
+    for student_id, status in records:
+        student = students.find_one({"student_id": student_id})
+        existing = attendance.find_one({"student_id": student_id, "subject_id": subject["subject_id"], "date": date})
+        if existing:
+            attendance.update_one({"_id": existing["_id"]}, {"$set": {"status": status, "updated_by": marked_by}})
+        else:
+            attendance.insert_one({
+                "student_id": student_id, "student_name": student["name"], "subject_id": subject["subject_id"],
+                "subject_name": subject["name"], "course": student["course"], "class_year": student["class_year"],
+                "division": student["division"], "status": status, "date": date, "marked_by": marked_by
+            })
+
+
+def bulk_write(attendance, students, subject, date, records, marked_by):
+    write_attendance(attendance, students, subject, date, records, marked_by)
+
+
+def measure(db, subject, count, writer):
+    counter = {}
+    attendance = CountingCollection(db.attendance, counter)
+    students = CountingCollection(db.students, counter)
+    date = datetime.datetime(2024, 1, 1)
+    records = [(f"S{i:05d}", "present") for i in range(count)]
+
+    db.attendance.delete_many({})
+    start = time.perf_counter()
+    writer(attendance, students, subject, date, records, "T001")  # first marking inserts
+    writer(attendance, students, subject, date, records, "T001")  # re-marking updates
+    elapsed = time.perf_counter() - start
+    return {"round_trips": sum(counter.values()), "calls": counter, "ms": round(elapsed * 1000, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Attendance write round-trip benchmark")
+    parser.add_argument("--students", type=int, default=100)
+    parser.add_argument("--uri", help="MongoDB URI, defaults to an in-process mongomock")
+    args = parser.parse_args()
+
+    db = connect(args.uri)
+    subject = seed(db, args.students)
+    for name, writer in [("legacy", legacy_write), ("bulk", bulk_write)]:
+        print(name, measure(db, subject, args.students, writer))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# Latency and recall of downscale-then-detect at several scales.
+#
+# With --faces, synthetic 1080p classroom frames are composed by pasting the faces
+# found in those portraits at random positions and sizes, which gives exact
+# ground-truth boxes:
+#   python benchmarks/bench_detection_scale.py --faces portraits/ --frames 20
+# With --images, real frames are used and recall is measured against full-resolution detection:
+#   python benchmarks/bench_detection_scale.py --images classroom_frames/
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from common import ROOT, load_images, run_metadata, write_results
+
+sys.path.insert(0, ROOT)
+
+from face_pipeline import detect_faces, encode_faces
+
+
+def face_crops(portraits):
+    crops = []
+    for image in portraits:
+        for top, right, bottom, left in detect_faces(image):
+            # Keep some context around the face so the pasted face is still detectable
+            margin = (bottom - top) // 2
+            crops.append(image[max(0, top - margin):bottom + margin, max(0, left - margin):right + margin])
+    return crops
+
+
+# Compose frames of the given size with faces of random size at random positions.
+# Returns [(frame, ground_truth_boxes)].
+def synthetic_frames(crops, count, faces_per_frame, size=(1080, 1920), face_sizes=(60, 240), seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(count):
+        frame = np.full(size + (3,), 90, dtype=np.uint8)
+        boxes = []
+        for _ in range(faces_per_frame):
+            crop = crops[rng.integers(len(crops))]
+            side = int(rng.integers(*face_sizes)) * 2  # crops are about twice the face size
+            crop = cv2.resize(crop, (side, side * crop.shape[0] // crop.shape[1]))
+            h, w = crop.shape[:2]
+            if h >= size[0] or w >= size[1]:
+                continue
+            top, left = int(rng.integers(size[0] - h)), int(rng.integers(size[1] - w))
+            if any(_iou((top, left + w, top + h, left), box) > 0 for box in boxes):
+                continue
+            frame[top:top + h, left:left + w] = crop
+            boxes.append((top, left + w, top + h, left))
+        frames.append((frame, boxes))
+    return frames
+
+
+def _iou(a, b):
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area = lambda box: (box[2] - box[0]) * (box[1] - box[3])
+    return inter / float(area(a) + area(b) - inter) if inter else 0.0
+
+
+# A detection counts if it overlaps a ground-truth box; pasted boxes include a
+# margin around the face, so the face covers only part of them
+def _recall(found, truth, threshold):
+    if not truth:
+        return None
+    matched = sum(1 for box in truth if any(_contains(box, f) or _iou(box, f) >= threshold for f in found))
+    return matched / len(truth)
+
+
+def _contains(outer, inner):
+    return outer[0] <= inner[0] and outer[1] >= inner[1] and outer[2] >= inner[2] and outer[3] <= inner[3]
+
+
+def run(frames, scale, min_face_size, iou):
+    detect_ms, encode_ms, recalls, faces = [], [], [], 0
+    for frame, truth in frames:
+        start = time.perf_counter()
+        found = detect_faces(frame, scale, min_face_size)
+        detect_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        encode_faces(frame, found)
+        encode_ms.append((time.perf_counter() - start) * 1000)
+        faces += len(found)
+        recall = _recall(found, truth, iou)
+        if recall is not None:
+            recalls.append(recall)
+    total = np.array(detect_ms) + np.array(encode_ms)
+    return {
+        "scale": scale,
+        "min_face_size": min_face_size,
+        "faces": faces,
+        "recall": round(float(np.mean(recalls)), 4) if recalls else None,
+        "detect_p50_ms": round(float(np.percentile(detect_ms, 50)), 1),
+        "encode_p50_ms": round(float(np.percentile(encode_ms, 50)), 1),
+        "frame_p50_ms": round(float(np.percentile(total, 50)), 1),
+        "frame_p95_ms": round(float(np.percentile(total, 95)), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Downscale-then-detect benchmark")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--faces", help="directory of portraits used to synthesize classroom frames")
+    source.add_argument("--images", help="directory of real frames; recall is relative to scale 1.0")
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--faces-per-frame", type=int, default=12)
+    parser.add_argument("--scales", default="1.0,0.75,0.5,0.35,0.25")
+    parser.add_argument("--min-face-size", type=int, default=0)
+    parser.add_argument("--iou", type=float, default=0.3)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.faces:
+        crops = face_crops(load_images(args.faces))
+        if not crops:
+            sys.exit("No faces found in the portraits")
+        frames = synthetic_frames(crops, args.frames, args.faces_per_frame)
+    else:
+        images = load_images(args.images)[:args.frames]
+        frames = [(image, detect_faces(image)) for image in images]
+
+    results = [run(frames, float(scale), args.min_face_size, args.iou) for scale in args.scales.split(",")]
+    for result in results:
+        print(result)
+    if args.output:
+        write_results(args.output, run_metadata(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# Enrollment throughput and match accuracy of single-encoding vs template galleries.
+#
+# Expects one directory per person (e.g. LFW): the first --enroll images of each
+# person are enrolled, the others are used as probes. People with fewer images
+# than --enroll + 1 are skipped, and --impostors of them are kept out of the
+# gallery entirely so their probes measure false accepts:
+#   python benchmarks/bench_enrollment.py --people lfw/ --enroll 3 --workers 4
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from common import ROOT, image_files, run_metadata, write_results
+
+sys.path.insert(0, ROOT)
+
+from face_matching import match_frames
+from face_pipeline import FaceEncodingPool
+from face_templates import aggregate_template, largest_face
+
+
+def load_people(directory, min_images):
+    people = {}
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not os.path.isdir(path):
+            continue
+        files = image_files(path)
+        if len(files) >= min_images:
+            people[name] = files
+    return people
+
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+# Encode the largest face of every image; returns (encodings or None, images/s)
+def encode_images(pool, paths):
+    frames = [read_bytes(path) for path in paths]
+    start = time.perf_counter()
+    results = pool.encode_frames(frames)
+    elapsed = time.perf_counter() - start
+    encodings = [
+        face_encodings[largest_face(face_locations)] if face_locations else None
+        for face_locations, face_encodings in results
+    ]
+    return encodings, len(frames) / elapsed if elapsed else 0.0
+
+
+def build_gallery(enrolled, mode, method):
+    ids, templates, samples, owner = [], [], [], []
+    for person, encodings in enrolled.items():
+        if mode == "single":
+            templates.append(encodings[0])
+        else:
+            templates.append(aggregate_template(encodings, method))
+            if mode == "template+samples":
+                samples.extend(encodings)
+                owner.extend([len(ids)] * len(encodings))
+        ids.append(person)
+    return ids, np.vstack(templates), np.vstack(samples) if samples else None, np.asarray(owner, dtype=np.intp)
+
+
+def evaluate(probes, gallery, tolerance, margin):
+    ids, templates, samples, owner = gallery
+    counts = {"correct": 0, "wrong": 0, "missed": 0, "false_accepts": 0, "impostor_probes": 0}
+    start = time.perf_counter()
+    for person, encoding, enrolled in probes:
+        matches = match_frames([[encoding]], templates, tolerance, samples, owner if samples is not None else None,
+                               margin)[0]
+        found = ids[matches[0][1]] if matches else None
+        if not enrolled:
+            counts["impostor_probes"] += 1
+            counts["false_accepts"] += found is not None
+        elif found is None:
+            counts["missed"] += 1
+        else:
+            counts["correct" if found == person else "wrong"] += 1
+    genuine = len(probes) - counts["impostor_probes"]
+    counts["accuracy"] = round(counts["correct"] / genuine, 4) if genuine else None
+    counts["match_ms"] = round((time.perf_counter() - start) * 1000 / max(len(probes), 1), 3)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-encoding enrollment benchmark")
+    parser.add_argument("--people", required=True, help="directory with one sub-directory of images per person")
+    parser.add_argument("--enroll", type=int, default=3, help="images enrolled per person")
+    parser.add_argument("--impostors", type=int, default=10, help="people left out of the gallery")
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--template", choices=["mean", "medoid"], default="mean")
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    parser.add_argument("--margin", type=float, default=0.08)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    people = load_people(args.people, args.enroll + 1)
+    if len(people) <= args.impostors:
+        sys.exit(f"Need more than {args.impostors} people with at least {args.enroll + 1} images")
+
+    pool = FaceEncodingPool(args.workers)
+    pool.start()
+    try:
+        names = list(people)
+        impostors = set(names[:args.impostors])
+        enroll_paths = [path for name in names if name not in impostors for path in people[name][:args.enroll]]
+        encodings, enroll_rate = encode_images(pool, enroll_paths)
+
+        enrolled = {}
+        for name, encoding in zip([n for n in names if n not in impostors for _ in range(args.enroll)], encodings):
+            if encoding is not None:
+                enrolled.setdefault(name, []).append(encoding)
+
+        probe_owners = [(name, name not in impostors) for name in names for _ in people[name][args.enroll:]]
+        probe_paths = [path for name in names for path in people[name][args.enroll:]]
+        probe_encodings, _ = encode_images(pool, probe_paths)
+        probes = [
+            (name, encoding, is_enrolled and name in enrolled)
+            for (name, is_enrolled), encoding in zip(probe_owners, probe_encodings)
+            if encoding is not None
+        ]
+    finally:
+        pool.shutdown()
+
+    results = {
+        "people": len(enrolled),
+        "enrollment_images": len(enroll_paths),
+        "enrollment_images_per_s": round(enroll_rate, 2),
+        "probes": len(probes),
+        "modes": {}
+    }
+    for mode in ("single", "template", "template+samples"):
+        gallery = build_gallery(enrolled, mode, args.template)
+        results["modes"][mode] = evaluate(probes, gallery, args.tolerance, args.margin)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        write_results(args.output, run_metadata(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Compare recall and latency of the face index backends against brute force.
+#
+#   python benchmarks/bench_face_index.py --gallery 20000 --queries 500
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from common import (ROOT, compare, print_results, run_metadata, summarize, synthetic_encodings, synthetic_probes,
+                    write_results)
+
+sys.path.insert(0, ROOT)
+
+from face_index import IVFIndex, create_index, hnswlib
+
+
+def run(kind, gallery, probes, k, exact, params):
+    ids = [f"S{i:05d}" for i in range(len(gallery))]
+    start = time.perf_counter()
+    index = create_index(kind, **params)
+    if kind == IVFIndex.kind:
+        index.train(gallery)
+    index.add(ids, gallery)
+    build_seconds = time.perf_counter() - start
+
+    samples = []
+    found = []
+    for probe in probes:
+        start = time.perf_counter()
+        found.append(index.search(probe[None, :], k)[0])
+        samples.append(time.perf_counter() - start)
+
+    recall = np.mean([
+        len({i for i, _ in got} & {i for i, _ in want}) / len(want)
+        for got, want in zip(found, exact)
+    ])
+    result = summarize("search", samples, backend=kind, gallery=len(gallery), k=k, **params)
+    result.update({"build_s": round(build_seconds, 3), "recall": round(float(recall), 4)})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Face index recall/latency benchmark")
+    parser.add_argument("--gallery", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=1)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--ef", type=int, default=64)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="results JSON of an earlier run to compare with")
+    args = parser.parse_args()
+
+    # Probes are gallery identities re-captured with some noise
+    gallery = synthetic_encodings(args.gallery)
+    probes = synthetic_probes(gallery, args.queries, noise=0.03)
+    backends = {
+        "flat": {},
+        "ivf": {"nprobe": args.nprobe},
+        "hnsw": {"ef": args.ef, "max_elements": len(gallery)},
+    }
+    if hnswlib is None:
+        print("hnswlib not installed, skipping the hnsw backend")
+        backends.pop("hnsw")
+
+    exact = create_index("flat")
+    exact.add([f"S{i:05d}" for i in range(len(gallery))], gallery)
+    truth = [exact.search(p[None, :], args.k)[0] for p in probes]
+
+    results = [run(kind, gallery, probes, args.k, truth, params) for kind, params in backends.items()]
+    print_results(results)
+    for result in results:
+        print(f"{result['params']['backend']:6} recall@{args.k} {result['recall']:.4f}  build {result['build_s']:.3f} s")
+    if args.output:
+        write_results(args.output, run_metadata(args), results)
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# Offline benchmark of the facial recognition pipeline: each stage on its own,
+# then camera batches end to end through the Flask test client against an
+# in-memory MongoDB (mongomock). Results are written as JSON with the git
+# revision so runs can be compared across commits.
+#
+# Frames are synthetic unless --faces points at portraits, which are pasted into
+# classroom frames (see bench_detection_scale.py) and enrolled so the end-to-end
+# batches recognize them. Matching runs on synthetic galleries of each size.
+#   python benchmarks/bench_pipeline.py --galleries 100,1000,10000,50000 --output before.json
+#   python benchmarks/bench_pipeline.py --faces portraits/ --output after.json --compare before.json
+import argparse
+import base64
+import datetime
+import itertools
+import os
+import sys
+
+import cv2
+import numpy as np
+
+from common import (ROOT, compare, load_images, measure, print_results, run_metadata, summarize,
+                    synthetic_encodings, synthetic_probes, write_results)
+
+sys.path.insert(0, ROOT)
+
+# The server reads its configuration when imported. The end-to-end run replaces
+# the students and subjects, so it always uses the in-memory MongoDB. Every frame
+# is processed in full, since repeated frames would otherwise be skipped as
+# duplicates or followed by the tracker instead of encoded.
+os.environ["MONGO_URI"] = "mongomock://"
+os.environ.setdefault("FRAME_QUALITY_GATE", "0")
+os.environ.setdefault("FACE_TRACKING", "0")
+
+from face_codec import decode_matrix, encode_encoding
+from face_matching import match_frames
+from face_pipeline import decode_image, detect_faces, encode_faces
+
+STAGES = ("decode", "detect", "encode", "gallery", "match", "e2e")
+
+
+# Smooth random textures, so JPEG sizes and decode times are close to camera frames
+def noise_frames(count, size, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(count):
+        small = rng.integers(0, 256, size=(size[0] // 8, size[1] // 8, 3), dtype=np.uint8)
+        frames.append((cv2.resize(small, (size[1], size[0]), interpolation=cv2.INTER_LINEAR), []))
+    return frames
+
+
+# Classroom frames composed from portraits, and the encodings of the faces in
+# them to enroll
+def portrait_frames(directory, count, faces_per_frame, size, seed=0):
+    from bench_detection_scale import face_crops, synthetic_frames
+
+    crops = face_crops(load_images(directory))
+    if not crops:
+        sys.exit("No faces found in the portraits")
+    enrolled = []
+    for crop in crops:
+        locations = detect_faces(crop)
+        if locations:
+            enrolled.append(encode_faces(crop, locations[:1])[0])
+    return synthetic_frames(crops, count, faces_per_frame, size=size, seed=seed), enrolled
+
+
+def jpeg(image):
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes()
+
+
+def cycle(items):
+    iterator = itertools.cycle(items)
+    return lambda: next(iterator)
+
+
+def bench_stages(stages, frames, galleries, faces_per_frame, detection, repeat):
+    results = []
+    encoded = [jpeg(image) for image, _ in frames]
+    b64 = ["data:image/jpeg;base64," + base64.b64encode(data).decode() for data in encoded]
+
+    if "decode" in stages:
+        next_b64, next_bytes = cycle(b64), cycle(encoded)
+        results.append(summarize("decode_base64", measure(lambda: decode_image(next_b64()), repeat),
+                                 size=f"{frames[0][0].shape[1]}x{frames[0][0].shape[0]}"))
+        results.append(summarize("decode_bytes", measure(lambda: decode_image(next_bytes()), repeat),
+                                 size=f"{frames[0][0].shape[1]}x{frames[0][0].shape[0]}"))
+
+    images = [image for image, _ in frames]
+    if "detect" in stages:
+        next_image = cycle(images)
+        results.append(summarize("detect", measure(lambda: detect_faces(next_image(), **detection), repeat),
+                                 scale=detection["scale"]))
+
+    if "encode" in stages:
+        located = [(image, detect_faces(image, **detection)) for image in images]
+        located = [(image, locations) for image, locations in located if locations]
+        if located:
+            faces = sum(len(locations) for _, locations in located) / len(located)
+            next_frame = cycle(located)
+            results.append(summarize("encode", measure(lambda: encode_faces(*next_frame()), repeat),
+                                     items=faces, faces_per_frame=round(faces, 1)))
+        else:
+            print("encode: no faces found in the frames, use --faces to benchmark encoding")
+
+    for size in galleries:
+        gallery = synthetic_encodings(size)
+        if "gallery" in stages:
+            blobs = [encode_encoding(vector) for vector in gallery]
+            results.append(summarize("gallery_decode", measure(lambda: decode_matrix(blobs), repeat),
+                                     items=size, gallery=size))
+        if "match" in stages:
+            matrix = np.ascontiguousarray(gallery, dtype=np.float64)
+            probes = synthetic_probes(gallery, faces_per_frame)
+            results.append(summarize("match", measure(lambda: match_frames([probes], matrix), repeat),
+                                     items=len(probes), gallery=size, faces=len(probes)))
+    return results
+
+
+# Students of a synthetic class, the first ones enrolled with the portrait faces
+def seed_class(server, size, enrolled):
+    server.students_collection.delete_many({})
+    server.subjects_collection.delete_many({})
+    server.attendance_collection.delete_many({})
+    gallery = synthetic_encodings(size)
+    enrolled = enrolled[:size]
+    if enrolled:
+        gallery[:len(enrolled)] = np.asarray(enrolled, dtype=np.float32)
+    server.students_collection.insert_many([
+        {
+            "student_id": f"S{i + 1:05d}",
+            "name": f"Student {i + 1}",
+            "course": "BENCH",
+            "class_year": "FY",
+            "division": "A",
+            "face_registered": True,
+            "face_encoding": encode_encoding(vector)
+        }
+        for i, vector in enumerate(gallery)
+    ])
+    server.subjects_collection.insert_one({
+        "subject_id": "B001", "name": "Benchmark", "course": "BENCH", "class_year": "FY", "teacher_id": "T001"
+    })
+    server.face_gallery_cache.invalidate()
+
+
+def bench_end_to_end(frames, sizes, enrolled, batch, repeat):
+    import server
+
+    client = server.app.test_client()
+    b64 = ["data:image/jpeg;base64," + base64.b64encode(jpeg(image)).decode() for image, _ in frames]
+    batches = cycle([
+        [b64[(start + i) % len(b64)] for i in range(batch)] for start in range(0, len(b64), batch)
+    ])
+    date = datetime.date.today().isoformat()
+    results = []
+    for size in sizes:
+        seed_class(server, size, enrolled)
+        recognized = []
+
+        def post():
+            response = client.post("/api/attendance/batch_facial", json={
+                "images": batches(), "subject_id": "B001", "teacher_id": "T001", "date": date
+            })
+            if response.status_code != 200:
+                raise RuntimeError(f"batch_facial returned {response.status_code}: {response.get_json()}")
+            recognized.append(len(response.get_json()["results"]))
+
+        def load():
+            server.face_gallery_cache.invalidate()
+            server.face_gallery_cache.get("BENCH", "FY")
+
+        results.append(summarize("gallery_load_mongomock", measure(load, max(3, repeat // 4), warmup=0),
+                                 items=size, gallery=size))
+        result = summarize("e2e_batch_facial", measure(post, repeat), items=batch, gallery=size, batch=batch)
+        result["recognized_per_batch"] = round(float(np.mean(recognized)), 2)
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Facial recognition pipeline benchmark")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"comma-separated subset of {','.join(STAGES)}")
+    parser.add_argument("--galleries", default="100,1000,10000,50000", help="gallery sizes for decode and match")
+    parser.add_argument("--e2e-galleries", default="1000", help="class sizes for the end-to-end batches")
+    parser.add_argument("--faces", help="directory of portraits used to compose frames with faces")
+    parser.add_argument("--frames", type=int, default=8, help="distinct frames, used in turn")
+    parser.add_argument("--frame-size", default="1280x720")
+    parser.add_argument("--faces-per-frame", type=int, default=6)
+    parser.add_argument("--batch", type=int, default=4, help="frames per end-to-end request")
+    parser.add_argument("--scale", type=float, default=1.0, help="detection downscale")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="results JSON of an earlier run to compare with")
+    args = parser.parse_args()
+
+    stages = set(args.stages.split(","))
+    width, height = (int(value) for value in args.frame_size.split("x"))
+    enrolled = []
+    if args.faces:
+        frames, enrolled = portrait_frames(args.faces, args.frames, args.faces_per_frame, (height, width), args.seed)
+    else:
+        frames = noise_frames(args.frames, (height, width), args.seed)
+
+    detection = {"scale": args.scale, "min_face_size": 0}
+    galleries = [int(size) for size in args.galleries.split(",") if size]
+    results = bench_stages(stages, frames, galleries, args.faces_per_frame, detection, args.repeat)
+    if "e2e" in stages:
+        sizes = [int(size) for size in args.e2e_galleries.split(",") if size]
+        results += bench_end_to_end(frames, sizes, enrolled, args.batch, args.repeat)
+
+    print_results(results)
+    if args.output:
+        write_results(args.output, run_metadata(args), results)
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# Shared helpers of the benchmark scripts: timing, percentiles, synthetic data,
+# image loading and machine-readable results that can be compared across commits.
+import datetime
+import json
+import os
+import platform
+import subprocess
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+# Seconds taken by each of `repeat` calls of fn, after `warmup` untimed calls
+def measure(fn, repeat=20, warmup=2):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+# Latency percentiles in milliseconds and throughput; items is the number of
+# units (frames, faces...) processed per call
+def summarize(name, samples, items=1, **params):
+    ms = np.asarray(samples) * 1000
+    total = float(np.sum(samples))
+    return {
+        "name": name,
+        "params": params,
+        "calls": len(samples),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p90_ms": round(float(np.percentile(ms, 90)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "items_per_s": round(items * len(samples) / total, 2) if total else None
+    }
+
+
+# Encodings with roughly the spread of dlib's; probes of the same identities are
+# the same vectors plus some noise
+def synthetic_encodings(size, dim=128, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(0.0, 0.09, size=(size, dim)).astype(np.float32)
+
+
+def synthetic_probes(gallery, count, noise=0.02, seed=1):
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(gallery), size=min(count, len(gallery)), replace=False)
+    return gallery[rows] + rng.normal(0.0, noise, size=(len(rows), gallery.shape[1])).astype(np.float32)
+
+
+# Paths of the images in a directory, sorted by name
+def image_files(directory):
+    return [
+        os.path.join(directory, name)
+        for name in sorted(os.listdir(directory))
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+
+
+# The images of a directory that OpenCV can decode, as BGR arrays
+def load_images(directory):
+    images = (cv2.imread(path) for path in image_files(directory))
+    return [image for image in images if image is not None]
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                  capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return revision + ("-dirty" if dirty else "") if revision else None
+    except OSError:
+        return None
+
+
+def run_metadata(args):
+    return {
+        "revision": git_revision(),
+        "started_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "args": vars(args)
+    }
+
+
+def write_results(path, metadata, results):
+    with open(path, "w") as f:
+        json.dump({"metadata": metadata, "results": results}, f, indent=2)
+
+
+# Print the p50 of each result next to the same benchmark of an earlier run
+def compare(path, results):
+    with open(path) as f:
+        baseline = json.load(f)
+    earlier = {(r["name"], json.dumps(r["params"], sort_keys=True)): r for r in baseline["results"]}
+    print(f"\nCompared with {baseline['metadata'].get('revision')} ({path}):")
+    for result in results:
+        before = earlier.get((result["name"], json.dumps(result["params"], sort_keys=True)))
+        if before and before["p50_ms"]:
+            change = result["p50_ms"] / before["p50_ms"]
+            print(f"  {label(result):48} p50 {before['p50_ms']:10.3f} -> {result['p50_ms']:10.3f} ms  x{change:.2f}")
+
+
+def label(result):
+    params = ", ".join(f"{key}={value}" for key, value in result["params"].items())
+    return f"{result['name']} ({params})" if params else result["name"]
+
+
+def print_results(results):
+    for result in results:
+        print(f"{label(result):48} p50 {result['p50_ms']:10.3f} ms  p90 {result['p90_ms']:10.3f} ms  "
+              f"p99 {result['p99_ms']:10.3f} ms  {result['items_per_s']}/s")
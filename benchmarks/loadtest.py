@@ -0,0 +1,318 @@
+# Load test of many classrooms in camera mode at once. Every classroom posts a
+# batch of frames to /api/attendance/batch_facial every --interval seconds, as
+# the TeacherDashboard does, and its students send selfies to
+# /api/attendance/mark during the first --selfie-window seconds of class.
+# Batches are uploaded as multipart JPEG files like the dashboard sends them, or
+# as base64 data URLs in JSON with --encoding json.
+#
+# Requests are sent on schedule whatever the server's pace (open loop), so when
+# the server saturates, completed throughput falls behind the offered load and
+# latency grows. Each step of --classrooms is a separate run; the report gives
+# offered and completed request rates, latency percentiles, the delay between a
+# request's scheduled time and its send (client queueing), and the error rate.
+#
+# By default the server runs in this process with an in-memory MongoDB, and
+# --env sets its configuration:
+#   python benchmarks/loadtest.py --classrooms 5,10,20,40 --env FACE_WORKERS=4
+# Against a running server, the classes are seeded into its database directly:
+#   python benchmarks/loadtest.py --url http://localhost:5000 --mongo-uri mongodb://localhost:27017/
+import argparse
+import base64
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from common import ROOT, load_images, run_metadata, synthetic_encodings, write_results
+
+sys.path.insert(0, ROOT)
+
+from bench_pipeline import jpeg, noise_frames
+
+# Load-test classes are created under this course and removed before each run
+COURSE = "LOADTEST"
+
+
+def subject_id(classroom):
+    return f"B9{classroom + 1:04d}"
+
+
+def student_id(classroom, student):
+    return f"S9{classroom + 1:04d}{student + 1:04d}"
+
+
+def as_data_url(data):
+    return "data:image/jpeg;base64," + base64.b64encode(data).decode()
+
+
+# Classrooms of synthetic students with enrolled encodings; with portraits, the
+# first students are enrolled with the portrait faces
+def seed(db, classrooms, students, enrolled):
+    from face_codec import encode_encoding
+
+    db["students"].delete_many({"course": COURSE})
+    db["subjects"].delete_many({"course": COURSE})
+    db["attendance"].delete_many({"course": COURSE})
+    for classroom in range(classrooms):
+        gallery = synthetic_encodings(students, seed=classroom)
+        for i, encoding in enumerate(enrolled[:students]):
+            gallery[i] = encoding
+        db["students"].insert_many([
+            {
+                "student_id": student_id(classroom, i),
+                "name": f"Load student {i + 1}",
+                "course": COURSE,
+                "class_year": f"C{classroom + 1}",
+                "division": "A",
+                "face_registered": True,
+                "face_encoding": encode_encoding(vector)
+            }
+            for i, vector in enumerate(gallery)
+        ])
+        db["subjects"].insert_one({
+            "subject_id": subject_id(classroom),
+            "name": f"Load test {classroom + 1}",
+            "course": COURSE,
+            "class_year": f"C{classroom + 1}",
+            "teacher_id": "T001",
+            "attendance_enabled": True
+        })
+
+
+# Serve the app on a free local port in a background thread, one thread per request
+def start_local_server(env):
+    os.environ.update(env)
+    import server
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    httpd = make_server("127.0.0.1", 0, server.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=httpd.serve_forever, name="loadtest-server", daemon=True).start()
+    return server, httpd, f"http://127.0.0.1:{httpd.server_port}"
+
+
+# The body and content type of a batch: the fields plus each frame as an
+# "images" file part, like markBatchFacialAttendanceAPI, or JSON with data URLs
+def batch_body(fields, frames, encoding):
+    if encoding == "json":
+        body = dict(fields, images=[as_data_url(frame) for frame in frames])
+        return json.dumps(body).encode(), "application/json"
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for i, frame in enumerate(frames):
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="images"; filename="frame{i}.jpg"\r\n'
+                     f'Content-Type: image/jpeg\r\n\r\n'.encode() + frame + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def post(url, body, content_type, timeout):
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": content_type}, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code
+    except OSError as e:
+        return type(e).__name__
+
+
+# Time-ordered (at, kind, path, payload) requests of one run; the payload of a
+# batch is (fields, JPEG frames), encoded when it is sent
+def schedule(args, classrooms, batches, selfies, rng):
+    date = datetime.date.today().isoformat()
+    events = []
+    for classroom in range(classrooms):
+        start = rng.uniform(0, args.interval)
+        at = start
+        while at < args.duration:
+            frames = batches[int(rng.integers(len(batches)))]
+            events.append((at, "batch", "/api/attendance/batch_facial", (
+                {"subject_id": subject_id(classroom), "teacher_id": "T001", "date": date}, frames
+            )))
+            at += args.interval
+        for student in range(args.students if args.selfie_window else 0):
+            events.append((start + rng.uniform(0, args.selfie_window), "selfie", "/api/attendance/mark", {
+                "student_id": student_id(classroom, student),
+                "subject_id": subject_id(classroom),
+                "status": "present",
+                "date": date,
+                "image": selfies[student]
+            }))
+    return sorted(events, key=lambda event: event[0])
+
+
+# Camera batches, one selfie per student and the encodings to enroll. With
+# portraits, the first students are enrolled with one face each and send a
+# selfie of it; the others, like every student without portraits, send a
+# synthetic selfie with no face.
+def traffic(args):
+    width, height = (int(value) for value in args.frame_size.split("x"))
+    selfies = [as_data_url(jpeg(image)) for image, _ in noise_frames(4, (480, 640), args.seed + 1)]
+    selfies = [selfies[i % len(selfies)] for i in range(args.students)]
+    enrolled = []
+    if args.faces:
+        from bench_detection_scale import face_crops, synthetic_frames
+        from face_pipeline import detect_faces, encode_faces
+
+        crops = []
+        for crop in face_crops(load_images(args.faces)):
+            locations = detect_faces(crop)
+            if locations:
+                crops.append(crop)
+                enrolled.append(encode_faces(crop, locations[:1])[0])
+        if not crops:
+            sys.exit("No faces found in the portraits")
+        for i, crop in enumerate(crops[:args.students]):
+            selfies[i] = as_data_url(jpeg(crop))
+        frames = synthetic_frames(crops, 16, min(8, len(crops)), size=(height, width), seed=args.seed)
+    else:
+        frames = noise_frames(16, (height, width), args.seed)
+
+    frames = [jpeg(image) for image, _ in frames]
+    batches = [[frames[(i + j) % len(frames)] for j in range(args.batch_frames)] for i in range(len(frames))]
+    return batches, selfies, enrolled
+
+
+def run_step(args, base_url, classrooms, batches, selfies):
+    events = schedule(args, classrooms, batches, selfies, np.random.default_rng(args.seed))
+    records = []
+    lock = threading.Lock()
+
+    def send(scheduled, kind, path, payload):
+        if kind == "batch":
+            body, content_type = batch_body(*payload, args.encoding)
+        else:
+            body, content_type = json.dumps(payload).encode(), "application/json"
+        started = time.perf_counter()
+        status = post(base_url + path, body, content_type, args.timeout)
+        finished = time.perf_counter()
+        with lock:
+            records.append((kind, scheduled, started, finished, status))
+
+    origin = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for at, kind, path, payload in events:
+            delay = origin + at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, origin + at, kind, path, payload)
+    # Requests still in flight after the last scheduled one stretch the step
+    elapsed = max(args.duration, time.perf_counter() - origin)
+    return summarize_step(classrooms, records, elapsed, args)
+
+
+def summarize_step(classrooms, records, elapsed, args):
+    result = {"classrooms": classrooms, "encoding": args.encoding, "elapsed_s": round(elapsed, 2), "requests": {}}
+    for kind in ("batch", "selfie"):
+        rows = [r for r in records if r[0] == kind]
+        if not rows:
+            continue
+        latency = np.array([finished - started for _, _, started, finished, _ in rows]) * 1000
+        queueing = np.array([max(0.0, started - scheduled) for _, scheduled, started, _, _ in rows]) * 1000
+        statuses = {}
+        for row in rows:
+            statuses[str(row[4])] = statuses.get(str(row[4]), 0) + 1
+        # Rejections (e.g. no face in a synthetic selfie) are answers; errors are
+        # server failures, timeouts and refused connections
+        errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 500)
+        frames = args.batch_frames if kind == "batch" else 1
+        result["requests"][kind] = {
+            "count": len(rows),
+            "offered_per_s": round(len(rows) / args.duration, 2),
+            "completed_per_s": round(len(rows) / elapsed, 2),
+            "frames_per_s": round(len(rows) * frames / elapsed, 2),
+            "latency_ms": {p: round(float(np.percentile(latency, int(p[1:]))), 1) for p in ("p50", "p95", "p99")},
+            "queueing_ms": {p: round(float(np.percentile(queueing, int(p[1:]))), 1) for p in ("p50", "p99")},
+            "error_rate": round(errors / len(rows), 4),
+            "statuses": statuses
+        }
+    return result
+
+
+def print_step(result):
+    print(f"{result['classrooms']} classrooms, {result['encoding']} batches, {result['elapsed_s']}s")
+    for kind, stats in result["requests"].items():
+        print(f"  {kind:6} {stats['count']:5} requests  offered {stats['offered_per_s']:7.2f}/s  "
+              f"completed {stats['completed_per_s']:7.2f}/s ({stats['frames_per_s']:.1f} frames/s)  "
+              f"latency p50 {stats['latency_ms']['p50']} p95 {stats['latency_ms']['p95']} "
+              f"p99 {stats['latency_ms']['p99']} ms  queueing p99 {stats['queueing_ms']['p99']} ms  "
+              f"errors {100 * stats['error_rate']:.1f}%  {stats['statuses']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent camera-mode classrooms load test")
+    parser.add_argument("--classrooms", default="5,10,20", help="comma-separated steps")
+    parser.add_argument("--students", type=int, default=40, help="students per classroom")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds per step")
+    parser.add_argument("--interval", type=float, default=10.0, help="seconds between a classroom's batches")
+    parser.add_argument("--batch-frames", type=int, default=7)
+    parser.add_argument("--selfie-window", type=float, default=30.0,
+                        help="seconds after class start in which students send selfies (0 for none)")
+    parser.add_argument("--frame-size", default="640x480")
+    parser.add_argument("--encoding", choices=["multipart", "json"], default="multipart",
+                        help="upload of the batch frames (the dashboard sends multipart)")
+    parser.add_argument("--faces", help="directory of portraits to compose frames and selfies with faces")
+    parser.add_argument("--concurrency", type=int, default=256, help="client threads")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--url", help="base URL of a running server (default: serve the app in process)")
+    parser.add_argument("--mongo-uri", help="database of the server at --url, seeded directly")
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE for the in-process server")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    steps = [int(step) for step in args.classrooms.split(",")]
+    batches, selfies, enrolled = traffic(args)
+
+    if args.url:
+        if not args.mongo_uri:
+            sys.exit("--url needs --mongo-uri to seed the classes into the server's database")
+        from db import Mongo
+        db = Mongo(args.mongo_uri).db
+        base_url = args.url.rstrip("/")
+        app = httpd = None
+    else:
+        env = dict(entry.split("=", 1) for entry in args.env)
+        env["MONGO_URI"] = "mongomock://"
+        app, httpd, base_url = start_local_server(env)
+        db = app.db
+
+    results = []
+    try:
+        for classrooms in steps:
+            seed(db, classrooms, args.students, enrolled)
+            if app is not None:
+                app.face_gallery_cache.invalidate()
+            result = run_step(args, base_url, classrooms, batches, selfies)
+            print_step(result)
+            results.append(result)
+    finally:
+        if httpd is not None:
+            httpd.shutdown()
+            app.encoding_pool.shutdown()
+
+    saturation = max(
+        (r["requests"]["batch"]["frames_per_s"] for r in results if "batch" in r["requests"]), default=None)
+    print(f"Peak completed camera throughput: {saturation} frames/s")
+    if args.output:
+        write_results(args.output, run_metadata(args), results)
+
+
+if __name__ == "__main__":
+    main()
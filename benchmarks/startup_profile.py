@@ -0,0 +1,95 @@
+# Import-time breakdown and memory of the server process per SERVER_ROLE.
+#
+# Each role is imported in a fresh interpreter with -X importtime; the report
+# lists the slowest top-level imports, the wall time of "import server" and the
+# peak RSS. With --warm-up the vision models are then loaded and measured too:
+#   python benchmarks/startup_profile.py --roles core,all --warm-up --top 15
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, resource, sys, time
+start = time.perf_counter()
+import server
+result = {"import_s": time.perf_counter() - start}
+import vision
+if %(warm_up)r:
+    result["warm_up_s"] = vision.warm_up()
+result["vision_modules"] = vision.loaded_modules()
+# ru_maxrss is in KiB on Linux
+result["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps(result))
+"""
+
+
+# -X importtime lines: "import time: self [us] | cumulative | imported package",
+# the package name indented by two spaces per nesting level
+def parse_importtime(stderr):
+    imports = []
+    for line in stderr.splitlines():
+        fields = line[len("import time:"):].split("|")
+        if not line.startswith("import time:") or len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2]
+        imports.append({
+            "module": name.strip(),
+            "self_ms": int(fields[0]) / 1000,
+            "cumulative_ms": int(fields[1]) / 1000,
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2
+        })
+    return imports
+
+
+def profile(role, warm_up, top):
+    pythonpath = os.pathsep.join(filter(None, [ROOT, os.getenv("PYTHONPATH")]))
+    env = dict(os.environ, SERVER_ROLE=role, PYTHONPATH=pythonpath)
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD % {"warm_up": warm_up}],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if process.returncode:
+        sys.exit(f"{role}: import failed\n{process.stderr[-2000:]}")
+
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    imports = parse_importtime(process.stderr)
+    # "import server" and the modules it imports directly
+    top_level = [i for i in imports if i["depth"] <= 1]
+    result["role"] = role
+    result["slowest_imports"] = [
+        {"module": i["module"], "cumulative_ms": round(i["cumulative_ms"], 1)}
+        for i in sorted(top_level, key=lambda i: i["cumulative_ms"], reverse=True)[:top]
+    ]
+    result["import_s"] = round(result["import_s"], 3)
+    result["max_rss_mb"] = round(result["max_rss_mb"], 1)
+    if "warm_up_s" in result:
+        result["warm_up_s"] = round(result["warm_up_s"], 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server startup profile")
+    parser.add_argument("--roles", default="core,all")
+    parser.add_argument("--warm-up", action="store_true", help="also load the vision models")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = [profile(role, args.warm_up, args.top) for role in args.roles.split(",")]
+    for result in results:
+        print(f"{result['role']}: import {result['import_s']}s, peak RSS {result['max_rss_mb']} MB"
+              + (f", warm-up {result['warm_up_s']}s" if "warm_up_s" in result else ""))
+        print(f"  vision modules loaded: {', '.join(m for m, loaded in result['vision_modules'].items() if loaded) or 'none'}")
+        for entry in result["slowest_imports"]:
+            print(f"  {entry['cumulative_ms']:9.1f} ms  {entry['module']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
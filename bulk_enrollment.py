@@ -0,0 +1,233 @@
+import json
+import os
+import re
+import time
+import zipfile
+
+from pymongo import UpdateOne
+
+from face_codec import encode_encoding, decode_encoding
+from face_templates import aggregate_template, merge_encodings
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+STUDENT_ID = re.compile(r"^S\d+$")
+
+
+# Images are named by student_id: S00012.jpg, S00012_2.jpg, or S00012/any.jpg
+def student_id_for(name):
+    parts = name.replace("\\", "/").split("/")
+    candidate = re.split(r"[_\-\s.]", os.path.splitext(parts[-1])[0])[0].upper()
+    if STUDENT_ID.match(candidate):
+        return candidate
+    if len(parts) > 1 and STUDENT_ID.match(parts[-2].upper()):
+        return parts[-2].upper()
+    return None
+
+
+# The images of a zip archive or a directory tree, by relative name
+class ImageSource:
+    def __init__(self, path):
+        self.path = path
+        self.archive = zipfile.ZipFile(path) if zipfile.is_zipfile(path) else None
+        if self.archive is not None:
+            names = [info.filename for info in self.archive.infolist() if not info.is_dir()]
+        else:
+            names = [
+                os.path.relpath(os.path.join(root, f), path)
+                for root, _, files in os.walk(path) for f in files
+            ]
+        self.names = sorted(
+            name for name in names
+            if name.lower().endswith(IMAGE_EXTENSIONS) and not os.path.basename(name).startswith(".")
+        )
+
+    def read(self, name):
+        if self.archive is not None:
+            return self.archive.read(name)
+        with open(os.path.join(self.path, name), "rb") as f:
+            return f.read()
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+
+
+# Per-file results of earlier runs, one JSON object per line
+def load_checkpoint(path):
+    done = {}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entry = json.loads(line)
+                    done[entry["file"]] = entry
+    return done
+
+
+# Enrolls the faces of a whole intake. Images are detected and encoded in
+# parallel on the encoding pool, a batch at a time, and every batch is written
+# with one bulk update. Each file's outcome is appended to the checkpoint after
+# its batch is written, so an interrupted run resumes where it stopped.
+class BulkEnrollment:
+    def __init__(self, students_collection, pool, dtype="float32", normalize=False, max_encodings=5,
+                 template="mean", detection=None, batch_size=64):
+        self.students_collection = students_collection
+        self.pool = pool
+        self.dtype = dtype
+        self.normalize = normalize
+        self.max_encodings = max_encodings
+        self.template = template
+        self.detection = detection
+        self.batch_size = batch_size
+
+    # on_batch(updated) is called after each batch is written with
+    # {student_id: (student, template vector)}. Returns the run report.
+    def run(self, path, checkpoint=None, replace=False, on_batch=None, on_progress=None):
+        source = ImageSource(path)
+        done = load_checkpoint(checkpoint)
+        # With replace, a student's earlier encodings are dropped once per run
+        replaced = {entry["student_id"] for entry in done.values() if entry["status"] == "enrolled"}
+        pending = [name for name in source.names if name not in done]
+        start = time.perf_counter()
+        processed = 0
+        try:
+            for i in range(0, len(pending), self.batch_size):
+                entries, updated = self._enroll_batch(source, pending[i:i + self.batch_size], replace, replaced)
+                if checkpoint:
+                    with open(checkpoint, "a") as f:
+                        f.writelines(json.dumps(entry) + "\n" for entry in entries)
+                        f.flush()
+                        os.fsync(f.fileno())
+                for entry in entries:
+                    done[entry["file"]] = entry
+                processed += len(entries)
+                if on_batch and updated:
+                    on_batch(updated)
+                if on_progress:
+                    on_progress(len(done), len(source.names))
+        finally:
+            source.close()
+
+        elapsed = time.perf_counter() - start
+        counts = {}
+        for entry in done.values():
+            counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        return {
+            "files": len(source.names),
+            "processed": processed,
+            "resumed_from": len(source.names) - len(pending),
+            "images_per_s": round(processed / elapsed, 2) if elapsed and processed else None,
+            "students": len({e["student_id"] for e in done.values() if e["status"] == "enrolled"}),
+            "counts": counts,
+            "failures": sorted((e for e in done.values() if e["status"] != "enrolled"), key=lambda e: e["file"])
+        }
+
+    def _enroll_batch(self, source, names, replace, replaced):
+        entries = {}
+        frames = []
+        framed = []
+        for name in names:
+            student_id = student_id_for(name)
+            if not student_id:
+                entries[name] = {"file": name, "student_id": None, "status": "invalid_name"}
+                continue
+            try:
+                frames.append(source.read(name))
+                framed.append((name, student_id))
+            except Exception as e:
+                entries[name] = {"file": name, "student_id": student_id, "status": "unreadable", "error": str(e)}
+
+        new_encodings = {}
+        for (name, student_id), (locations, encodings, error) in zip(
+                framed, self.pool.try_encode_frames(frames, self.detection)):
+            entry = {"file": name, "student_id": student_id}
+            if error:
+                entry.update(status="unreadable", error=error)
+            elif not locations:
+                entry["status"] = "no_face"
+            elif len(locations) > 1:
+                entry.update(status="multiple_faces", faces=len(locations))
+            else:
+                entry["status"] = "enrolled"
+                new_encodings.setdefault(student_id, []).append(encodings[0])
+            entries[name] = entry
+
+        students = {
+            student["student_id"]: student
+            for student in self.students_collection.find(
+                {"student_id": {"$in": list(new_encodings)}},
+                {"_id": 0, "student_id": 1, "course": 1, "class_year": 1, "face_encoding": 1, "face_encodings": 1}
+            )
+        }
+
+        operations = []
+        updated = {}
+        for student_id, vectors in new_encodings.items():
+            student = students.get(student_id)
+            if student is None:
+                for entry in entries.values():
+                    if entry["student_id"] == student_id and entry["status"] == "enrolled":
+                        entry["status"] = "unknown_student"
+                continue
+
+            existing = []
+            if not (replace and student_id not in replaced):
+                existing = [decode_encoding(blob) for blob in student.get("face_encodings") or []]
+                if not existing and student.get("face_encoding"):
+                    existing = [decode_encoding(student["face_encoding"])]
+            replaced.add(student_id)
+
+            encodings = merge_encodings(existing, vectors, self.max_encodings)
+            template = aggregate_template(encodings, self.template)
+            operations.append(UpdateOne({"student_id": student_id}, {"$set": {
+                "face_encoding": encode_encoding(template, self.dtype, self.normalize),
+                "face_encodings": [encode_encoding(v, self.dtype, self.normalize) for v in encodings],
+                "face_registered": True
+            }}))
+            updated[student_id] = (student, template)
+
+        if operations:
+            self.students_collection.bulk_write(operations, ordered=False)
+        return [entries[name] for name in names], updated
+
+
+if __name__ == "__main__":
+    import argparse
+    import server
+    from face_pipeline import FaceEncodingPool
+
+    parser = argparse.ArgumentParser(description="Enroll the faces of a zip or directory of images named by student_id")
+    parser.add_argument("source", help="zip archive or directory")
+    parser.add_argument("--checkpoint", help="resume file (default: <source>.checkpoint.jsonl)")
+    parser.add_argument("--report", help="write the JSON report to this file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--replace", action="store_true", help="drop the students' earlier encodings")
+    args = parser.parse_args()
+
+    pool = FaceEncodingPool(args.workers)
+    enrollment = BulkEnrollment(
+        server.students_collection, pool, server.face_encoding_dtype, server.face_encoding_normalize,
+        server.face_max_encodings, server.face_template_method, server.detection_settings(), args.batch_size
+    )
+    try:
+        report = enrollment.run(
+            args.source,
+            checkpoint=args.checkpoint or args.source.rstrip("/\\") + ".checkpoint.jsonl",
+            replace=args.replace,
+            on_progress=lambda done, total: print(f"\r{done}/{total} files", end="", flush=True)
+        )
+    finally:
+        pool.shutdown()
+    print()
+
+    if report["processed"]:
+        server.face_index.rebuild()
+    print(json.dumps({key: value for key, value in report.items() if key != "failures"}, indent=2))
+    for failure in report["failures"]:
+        print(f"{failure['status']:16} {failure['file']}")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
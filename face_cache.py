@@ -0,0 +1,107 @@
+import threading
+import time
+
+import numpy as np
+
+from face_codec import decode_matrix
+
+
+# A class gallery: one contiguous matrix of templates plus the aligned student
+# data, and the individual enrollment encodings behind them
+class FaceGallery:
+    def __init__(self, encodings, student_ids, students, samples=None, sample_owner=None):
+        self.encodings = encodings  # shape (n, 128), float64, one template per student
+        self.student_ids = student_ids  # list aligned with encodings rows
+        self.students = students  # list of student docs (no encoding blob) aligned with rows
+        self.samples = samples if samples is not None else np.empty((0, encodings.shape[1]), dtype=np.float32)
+        self.sample_owner = sample_owner if sample_owner is not None else np.empty(0, dtype=np.intp)
+        self.index = {sid: i for i, sid in enumerate(student_ids)}
+        self.loaded_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    def get_student(self, student_id):
+        i = self.index.get(student_id)
+        return self.students[i] if i is not None else None
+
+
+def load_gallery(students_collection, course, class_year):
+    students = students_collection.find({
+        "course": course,
+        "class_year": class_year,
+        "face_registered": True
+    }, {"_id": 0, "password": 0})
+
+    blobs = []
+    sample_blobs = []
+    sample_owner = []
+    student_ids = []
+    metadata = []
+    for student in students:
+        blob = student.pop("face_encoding", None)
+        samples = student.pop("face_encodings", None) or []
+        if not blob:
+            continue
+        sample_blobs.extend(samples)
+        sample_owner.extend([len(blobs)] * len(samples))
+        blobs.append(blob)
+        student_ids.append(student["student_id"])
+        metadata.append(student)
+
+    matrix = np.ascontiguousarray(decode_matrix(blobs), dtype=np.float64)
+    return FaceGallery(matrix, student_ids, metadata, decode_matrix(sample_blobs),
+                       np.asarray(sample_owner, dtype=np.intp))
+
+
+# Process-level cache of class galleries keyed by (course, class_year)
+class FaceGalleryCache:
+    def __init__(self, loader, ttl=None):
+        self.loader = loader  # callable(course, class_year) -> FaceGallery
+        self.ttl = ttl  # seconds, None means entries live until invalidated
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, course, class_year):
+        key = (course, class_year)
+        with self._lock:
+            gallery = self._entries.get(key)
+            if gallery is not None and not self._expired(gallery):
+                self.hits += 1
+                return gallery
+            self.misses += 1
+            generation = self._generation
+
+        gallery = self.loader(course, class_year)
+        with self._lock:
+            # Don't store a gallery that was invalidated while it was loading
+            if generation == self._generation:
+                self._entries[key] = gallery
+        return gallery
+
+    def invalidate(self, course=None, class_year=None):
+        with self._lock:
+            if course is None:
+                self._entries.clear()
+            else:
+                self._entries.pop((course, class_year), None)
+            self._generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "encodings": sum(len(g) for g in self._entries.values()),
+                "ttl": self.ttl
+            }
+
+    def _expired(self, gallery):
+        return self.ttl is not None and time.monotonic() - gallery.loaded_at > self.ttl
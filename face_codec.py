@@ -0,0 +1,113 @@
+import pickle
+import struct
+
+import numpy as np
+
+
+# Stored face encodings: a 12-byte little-endian header followed by the raw vector.
+#   magic "FE" | version u8 | dtype u8 | flags u8 | pad | dim u16 | scale f32
+# dtype is float32, float16 or int8 (int8 values are multiplied by scale); the
+# normalized flag marks vectors that were L2-normalized before storing.
+MAGIC = b"FE"
+VERSION = 1
+HEADER = struct.Struct("<2sBBBxHf")
+
+DTYPES = {"float32": 0, "float16": 1, "int8": 2}
+NUMPY_DTYPES = {0: np.dtype("<f4"), 1: np.dtype("<f2"), 2: np.dtype("i1")}
+FLAG_NORMALIZED = 1
+
+
+def encode_encoding(vector, dtype="float32", normalize=False):
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    if normalize:
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+
+    code = DTYPES[dtype]
+    scale = 1.0
+    if dtype == "int8":
+        scale = float(np.abs(vector).max()) / 127.0 or 1.0
+        data = np.round(vector / scale).astype(np.int8)
+    else:
+        data = vector.astype(NUMPY_DTYPES[code])
+
+    flags = FLAG_NORMALIZED if normalize else 0
+    return HEADER.pack(MAGIC, VERSION, code, flags, len(vector), scale) + data.tobytes()
+
+
+def is_legacy(blob):
+    return bytes(blob[:2]) != MAGIC
+
+
+def _parse(blob):
+    magic, version, code, flags, dim, scale = HEADER.unpack_from(blob)
+    if version != VERSION or code not in NUMPY_DTYPES:
+        raise ValueError(f"Unsupported face encoding format (version {version}, dtype {code})")
+    return code, dim, scale
+
+
+# Decode a stored encoding. float32 vectors are a read-only view of the blob,
+# other dtypes are dequantized to float32. Pickled arrays written before this
+# format are still read.
+def decode_encoding(blob):
+    if is_legacy(blob):
+        return np.asarray(pickle.loads(blob), dtype=np.float32)
+
+    code, dim, scale = _parse(blob)
+    data = np.frombuffer(blob, dtype=NUMPY_DTYPES[code], count=dim, offset=HEADER.size)
+    if code == DTYPES["float32"]:
+        return data
+    return data.astype(np.float32) * np.float32(scale) if code == DTYPES["int8"] else data.astype(np.float32)
+
+
+# Decode many blobs into one (n, dim) float32 matrix. When they are all float32
+# the payloads are joined and viewed with a single np.frombuffer.
+def decode_matrix(blobs, dim=128):
+    if not blobs:
+        return np.empty((0, dim), dtype=np.float32)
+    if all(not is_legacy(blob) and blob[2] == VERSION and blob[3] == DTYPES["float32"] for blob in blobs):
+        payload = b"".join(bytes(blob[HEADER.size:]) for blob in blobs)
+        return np.frombuffer(payload, dtype=NUMPY_DTYPES[0]).reshape(len(blobs), -1)
+    return np.vstack([decode_encoding(blob) for blob in blobs])
+
+
+# Convert the pickled encodings of the students collection to the current format
+def migrate(students_collection, dtype="float32", normalize=False, batch_size=500, dry_run=False):
+    from pymongo import UpdateOne
+
+    converted = 0
+    operations = []
+    for student in students_collection.find({"face_encoding": {"$exists": True, "$ne": None}},
+                                            {"_id": 1, "face_encoding": 1}):
+        blob = student["face_encoding"]
+        if not is_legacy(blob):
+            continue
+        converted += 1
+        if dry_run:
+            continue
+        encoded = encode_encoding(decode_encoding(blob), dtype, normalize)
+        operations.append(UpdateOne({"_id": student["_id"]}, {"$set": {"face_encoding": encoded}}))
+        if len(operations) >= batch_size:
+            students_collection.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        students_collection.bulk_write(operations, ordered=False)
+    return converted
+
+
+if __name__ == "__main__":
+    import argparse
+    import server
+
+    parser = argparse.ArgumentParser(description="Convert pickled face encodings to the compact binary format")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("--dtype", choices=list(DTYPES), default=server.face_encoding_dtype)
+    parser.add_argument("--normalize", action="store_true", default=server.face_encoding_normalize)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    count = migrate(server.students_collection, args.dtype, args.normalize, dry_run=args.dry_run)
+    print(f"{'Would convert' if args.dry_run else 'Converted'} {count} face encodings")
+    if count and not args.dry_run:
+        # The on-disk face index was built from the old encodings
+        server.face_index.rebuild()
+        print("Rebuilt the face index")
@@ -0,0 +1,403 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from face_codec import decode_matrix
+from face_matching import distance_matrix
+
+try:
+    import hnswlib
+except ImportError:  # optional ANN backend
+    hnswlib = None
+
+
+ENCODING_DIM = 128
+
+
+# Exact brute-force L2 index, the baseline every other backend is measured against
+class FlatIndex:
+    kind = "flat"
+
+    def __init__(self, dim=ENCODING_DIM, **params):
+        self.dim = dim
+        self.ids = []
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, ids, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        new_ids, new_rows = [], []
+        for item_id, vector in zip(ids, vectors):
+            pos = self.positions.get(item_id)
+            if pos is not None:
+                self.vectors[pos] = vector
+            else:
+                self.positions[item_id] = len(self.ids) + len(new_ids)
+                new_ids.append(item_id)
+                new_rows.append(vector)
+        if new_ids:
+            self.ids.extend(new_ids)
+            self.vectors = np.vstack([self.vectors, np.asarray(new_rows)])
+
+    def remove(self, item_id):
+        pos = self.positions.pop(item_id, None)
+        if pos is None:
+            return
+        last = len(self.ids) - 1
+        if pos != last:
+            self.ids[pos] = self.ids[last]
+            self.vectors[pos] = self.vectors[last]
+            self.positions[self.ids[pos]] = pos
+        self.ids.pop()
+        self.vectors = self.vectors[:last]
+
+    def search(self, queries, k=1):
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if not len(self.ids):
+            return [[] for _ in queries]
+        distances = distance_matrix(queries, self.vectors)
+        return _top_k(distances, self.ids, k)
+
+    def save(self, path):
+        np.savez(_tmp(path), ids=np.asarray(self.ids, dtype=str), vectors=self.vectors)
+        os.replace(_tmp(path) + ".npz", path + ".npz")
+        _write_meta(path, {"kind": self.kind, "dim": self.dim})
+
+    @classmethod
+    def load(cls, path, meta):
+        index = cls(dim=meta["dim"])
+        with np.load(path + ".npz", allow_pickle=False) as data:
+            index.add(data["ids"].tolist(), data["vectors"])
+        return index
+
+
+# Inverted-file index: a k-means coarse quantizer with exact search inside the
+# nprobe nearest lists. Pure NumPy, so it is always available.
+class IVFIndex:
+    kind = "ivf"
+
+    def __init__(self, dim=ENCODING_DIM, nlist=None, nprobe=8, **params):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids = None
+        self.lists = []  # one FlatIndex per centroid
+        self.assignment = {}  # id -> list number
+
+    def __len__(self):
+        return len(self.assignment)
+
+    def train(self, vectors, iterations=10, seed=0):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        nlist = self.nlist or max(1, int(np.sqrt(len(vectors))))
+        nlist = min(nlist, max(1, len(vectors)))
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy() if len(vectors) else \
+            np.zeros((1, self.dim), dtype=np.float32)
+        for _ in range(iterations if len(vectors) else 0):
+            labels = distance_matrix(vectors, centroids).argmin(axis=1)
+            for c in range(len(centroids)):
+                members = vectors[labels == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+        self.centroids = centroids.astype(np.float32)
+        self.nlist = len(self.centroids)
+        self.lists = [FlatIndex(self.dim) for _ in range(self.nlist)]
+        self.assignment = {}
+
+    def add(self, ids, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if self.centroids is None:
+            self.train(vectors)
+        labels = distance_matrix(vectors, self.centroids).argmin(axis=1)
+        for item_id, vector, label in zip(ids, vectors, labels):
+            self.remove(item_id)
+            self.lists[label].add([item_id], vector[None, :])
+            self.assignment[item_id] = int(label)
+
+    def remove(self, item_id):
+        label = self.assignment.pop(item_id, None)
+        if label is not None:
+            self.lists[label].remove(item_id)
+
+    def search(self, queries, k=1):
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if not len(self):
+            return [[] for _ in queries]
+        nprobe = min(self.nprobe, self.nlist)
+        probe_lists = np.argsort(distance_matrix(queries, self.centroids), axis=1)[:, :nprobe]
+        results = []
+        for query, lists in zip(queries, probe_lists):
+            candidates = []
+            for label in lists:
+                candidates.extend(self.lists[label].search(query[None, :], k)[0])
+            candidates.sort(key=lambda c: c[1])
+            results.append(candidates[:k])
+        return results
+
+    def save(self, path):
+        ids = []
+        vectors = []
+        labels = []
+        for label, flat in enumerate(self.lists):
+            ids.extend(flat.ids)
+            vectors.append(flat.vectors)
+            labels.extend([label] * len(flat.ids))
+        np.savez(
+            _tmp(path),
+            centroids=self.centroids,
+            ids=np.asarray(ids, dtype=str),
+            vectors=np.vstack(vectors) if vectors else np.empty((0, self.dim), dtype=np.float32),
+            labels=np.array(labels, dtype=np.int32)
+        )
+        os.replace(_tmp(path) + ".npz", path + ".npz")
+        _write_meta(path, {"kind": self.kind, "dim": self.dim, "nlist": self.nlist, "nprobe": self.nprobe})
+
+    @classmethod
+    def load(cls, path, meta):
+        index = cls(dim=meta["dim"], nlist=meta["nlist"], nprobe=meta["nprobe"])
+        with np.load(path + ".npz", allow_pickle=False) as data:
+            index.centroids = data["centroids"]
+            index.lists = [FlatIndex(index.dim) for _ in range(index.nlist)]
+            for item_id, vector, label in zip(data["ids"].tolist(), data["vectors"], data["labels"]):
+                index.lists[label].add([item_id], vector[None, :])
+                index.assignment[item_id] = int(label)
+        return index
+
+
+# HNSW graph index backed by hnswlib (optional dependency)
+class HNSWIndex:
+    kind = "hnsw"
+
+    def __init__(self, dim=ENCODING_DIM, max_elements=10000, M=16, ef_construction=200, ef=64, **params):
+        if hnswlib is None:
+            raise RuntimeError("The hnsw face index backend requires the hnswlib package")
+        self.dim = dim
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef = ef
+        self.index = hnswlib.Index(space="l2", dim=dim)
+        self.index.init_index(max_elements=max_elements, M=M, ef_construction=ef_construction,
+                              allow_replace_deleted=True)
+        self.index.set_ef(ef)
+        self.labels = {}  # id -> hnsw integer label
+        self.ids = {}  # hnsw integer label -> id
+        self.next_label = 0
+
+    def __len__(self):
+        return len(self.labels)
+
+    def add(self, ids, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        for item_id in ids:
+            self.remove(item_id)
+        needed = self.index.get_current_count() + len(ids)
+        if needed > self.index.get_max_elements():
+            self.index.resize_index(max(needed, 2 * self.index.get_max_elements()))
+        labels = []
+        for item_id in ids:
+            self.labels[item_id] = self.next_label
+            self.ids[self.next_label] = item_id
+            labels.append(self.next_label)
+            self.next_label += 1
+        self.index.add_items(vectors, np.array(labels), replace_deleted=True)
+
+    def remove(self, item_id):
+        label = self.labels.pop(item_id, None)
+        if label is not None:
+            self.ids.pop(label, None)
+            self.index.mark_deleted(label)
+
+    def search(self, queries, k=1):
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if not len(self):
+            return [[] for _ in queries]
+        k = min(k, len(self))
+        labels, sq_distances = self.index.knn_query(queries, k=k)
+        return [
+            [(self.ids[int(label)], float(np.sqrt(max(d, 0.0)))) for label, d in zip(row_labels, row_dist)]
+            for row_labels, row_dist in zip(labels, sq_distances)
+        ]
+
+    def save(self, path):
+        self.index.save_index(_tmp(path) + ".bin")
+        os.replace(_tmp(path) + ".bin", path + ".bin")
+        _write_meta(path, {
+            "kind": self.kind, "dim": self.dim, "M": self.M, "ef_construction": self.ef_construction,
+            "ef": self.ef, "labels": self.labels, "next_label": self.next_label
+        })
+
+    @classmethod
+    def load(cls, path, meta):
+        index = cls(dim=meta["dim"], max_elements=1, M=meta["M"], ef_construction=meta["ef_construction"], ef=meta["ef"])
+        index.index = hnswlib.Index(space="l2", dim=index.dim)
+        index.index.load_index(path + ".bin", allow_replace_deleted=True)
+        index.index.set_ef(index.ef)
+        index.labels = meta["labels"]
+        index.ids = {label: item_id for item_id, label in index.labels.items()}
+        index.next_label = meta["next_label"]
+        return index
+
+
+INDEX_BACKENDS = {
+    FlatIndex.kind: FlatIndex,
+    IVFIndex.kind: IVFIndex,
+    HNSWIndex.kind: HNSWIndex,
+}
+
+
+def create_index(kind="flat", **params):
+    if kind not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown face index backend: {kind}")
+    return INDEX_BACKENDS[kind](**params)
+
+
+def read_meta(path):
+    with open(path + ".json") as f:
+        return json.load(f)
+
+
+def load_index(path, meta=None):
+    meta = meta or read_meta(path)
+    return INDEX_BACKENDS[meta["kind"]].load(path, meta)
+
+
+# Build an index over every registered face encoding in the institution
+def build_index(students_collection, kind="flat", **params):
+    ids = []
+    blobs = []
+    for student in students_collection.find({"face_registered": True}, {"_id": 0, "student_id": 1, "face_encoding": 1}):
+        if student.get("face_encoding"):
+            ids.append(student["student_id"])
+            blobs.append(student["face_encoding"])
+
+    if kind == HNSWIndex.kind:
+        params.setdefault("max_elements", max(len(ids), 1000))
+    index = create_index(kind, **params)
+    if ids:
+        vectors = decode_matrix(blobs)
+        if kind == IVFIndex.kind:
+            index.train(vectors)
+        index.add(ids, vectors)
+    return index
+
+
+# Owns the process-wide index: loads it from disk, builds it from the database
+# when missing or stale, applies incremental updates and saves them back.
+class FaceIndexManager:
+    def __init__(self, students_collection, path=None, kind="flat", save_every=1, **params):
+        self.students_collection = students_collection
+        self.path = path
+        self.kind = kind
+        self.params = params
+        self.save_every = save_every
+        self.index = None
+        self.pending_saves = 0
+        self._checked = False
+        self._lock = threading.RLock()
+
+    # A saved index of another backend or with other parameters (e.g. after
+    # FACE_INDEX_BACKEND changed), or in an older file format, is rebuilt
+    def load(self):
+        with self._lock:
+            if self.path and os.path.exists(self.path + ".json"):
+                meta = read_meta(self.path)
+                if not self._configured(meta):
+                    print(f"Face index at {self.path} was built as {meta.get('kind')} with other settings, "
+                          f"rebuilding it as {self.kind}")
+                    return self.rebuild()
+                try:
+                    self.index = load_index(self.path, meta)
+                except ValueError as e:
+                    print(f"Could not load the face index at {self.path} ({e}), rebuilding")
+                    return self.rebuild()
+                print(f"Loaded {self.index.kind} face index with {len(self.index)} encodings from {self.path}")
+            return self.index
+
+    def _configured(self, meta):
+        return meta.get("kind") == self.kind and all(
+            meta.get(name) == value for name, value in self.params.items() if name in meta and value is not None
+        )
+
+    # The index is loaded from disk on first use unless load() was called at startup
+    def get(self):
+        with self._lock:
+            if self.index is None:
+                self.load()
+            if self.index is None:
+                self.rebuild()
+            elif not self._checked:
+                # An index saved before a crash may be missing recent registrations
+                registered = self.students_collection.count_documents({"face_registered": True})
+                if registered != len(self.index):
+                    self.rebuild()
+            self._checked = True
+            return self.index
+
+    def rebuild(self):
+        with self._lock:
+            self.index = build_index(self.students_collection, self.kind, **self.params)
+            self._checked = True
+            self.save()
+            return self.index
+
+    def update(self, student_id, encoding):
+        with self._lock:
+            if self.index is None:
+                return  # built from the database, including this encoding, on first use
+            self.index.add([student_id], np.asarray(encoding)[None, :])
+            self.pending_saves += 1
+            if self.pending_saves >= self.save_every:
+                self.save()
+
+    def save(self):
+        with self._lock:
+            if self.path and self.index is not None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self.index.save(self.path)
+            self.pending_saves = 0
+
+    def search(self, queries, k=1):
+        index = self.get()
+        with self._lock:
+            return index.search(queries, k)
+
+
+def _top_k(distances, ids, k):
+    k = min(k, distances.shape[1])
+    if k < distances.shape[1]:
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    else:
+        nearest = np.tile(np.arange(distances.shape[1]), (len(distances), 1))
+    results = []
+    for row, cols in zip(distances, nearest):
+        cols = cols[np.argsort(row[cols])]
+        results.append([(ids[c], float(row[c])) for c in cols])
+    return results
+
+
+def _tmp(path):
+    return path + ".tmp"
+
+
+def _write_meta(path, meta):
+    with open(_tmp(path) + ".json", "w") as f:
+        json.dump(meta, f)
+    os.replace(_tmp(path) + ".json", path + ".json")
+
+
+if __name__ == "__main__":
+    import argparse
+    import server
+
+    parser = argparse.ArgumentParser(description="Rebuild the institution-wide face index from the database")
+    parser.add_argument("command", choices=["build"])
+    args = parser.parse_args()
+
+    index = server.face_index.rebuild()
+    print(f"Built {index.kind} face index with {len(index)} encodings at {server.face_index.path}")
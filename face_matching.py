@@ -0,0 +1,86 @@
+import numpy as np
+
+
+# Euclidean distances between every probe and every gallery encoding in one operation
+def distance_matrix(probes, gallery):
+    probes = np.asarray(probes, dtype=np.float64)
+    gallery = np.asarray(gallery, dtype=np.float64)
+    if probes.size == 0 or gallery.size == 0:
+        return np.empty((len(probes), len(gallery)), dtype=np.float64)
+
+    sq = (
+        np.einsum("ij,ij->i", probes, probes)[:, None]
+        + np.einsum("ij,ij->i", gallery, gallery)[None, :]
+        - 2.0 * probes @ gallery.T
+    )
+    np.maximum(sq, 0.0, out=sq)
+    return np.sqrt(sq, out=sq)
+
+
+# Assign faces to gallery entries, nearest pairs first, so that every face and
+# every gallery entry is used at most once. Returns [(face_idx, gallery_idx, distance)].
+def assign_matches(distances, tolerance=0.5):
+    face_idx, gallery_idx = np.nonzero(distances <= tolerance)
+    if not len(face_idx):
+        return []
+
+    candidate_distances = distances[face_idx, gallery_idx]
+    order = np.argsort(candidate_distances, kind="stable")
+
+    used_faces = set()
+    used_gallery = set()
+    matches = []
+    for k in order:
+        f, g = int(face_idx[k]), int(gallery_idx[k])
+        if f in used_faces or g in used_gallery:
+            continue
+        used_faces.add(f)
+        used_gallery.add(g)
+        matches.append((f, g, float(candidate_distances[k])))
+    return matches
+
+
+# Second look at borderline pairs: where a probe's template distance is just
+# above tolerance (within margin), use its distance to the nearest of that
+# student's individual encodings instead. samples are the individual encodings
+# and sample_owner the gallery row each one belongs to.
+def refine_borderline(probes, distances, samples, sample_owner, tolerance=0.5, margin=0.08):
+    borderline = (distances > tolerance) & (distances <= tolerance + margin)
+    rows = np.flatnonzero(borderline.any(axis=1))
+    if not len(rows) or not len(samples):
+        return distances
+
+    sample_distances = distance_matrix(probes[rows], samples)
+    nearest = np.full((len(rows), distances.shape[1]), np.inf)
+    np.minimum.at(nearest, (np.arange(len(rows))[:, None], np.asarray(sample_owner)[None, :]), sample_distances)
+
+    refined = distances.copy()
+    refined[rows] = np.where(borderline[rows], np.minimum(distances[rows], nearest), distances[rows])
+    return refined
+
+
+# Match the faces of several frames against a gallery with a single distance
+# computation. frame_encodings is a list (one entry per frame) of encoding lists.
+# With samples/sample_owner, borderline template matches are re-checked against
+# the individual encodings (see refine_borderline).
+# Returns one list of (face_idx, gallery_idx, distance) per frame.
+def match_frames(frame_encodings, gallery, tolerance=0.5, samples=None, sample_owner=None, margin=0.08):
+    counts = [len(encodings) for encodings in frame_encodings]
+    if not sum(counts) or not len(gallery):
+        return [[] for _ in frame_encodings]
+
+    probes = np.vstack([np.asarray(e, dtype=np.float64) for e in frame_encodings if len(e)])
+    distances = distance_matrix(probes, gallery)
+    if samples is not None:
+        distances = refine_borderline(probes, distances, samples, sample_owner, tolerance, margin)
+
+    matches = []
+    offset = 0
+    for count in counts:
+        matches.append(assign_matches(distances[offset:offset + count], tolerance))
+        offset += count
+    return matches
+
+
+def match_confidence(distance, tolerance=0.5):
+    return max(0.0, 1.0 - distance / tolerance)
@@ -0,0 +1,302 @@
+import base64
+import multiprocessing
+import os
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from face_tracking import associate
+from metrics import collect_stages, record_stages, stage, count, frames_total
+from vision import lazy_import
+
+# Imported on first use, see vision.py
+cv2 = lazy_import("cv2")
+face_recognition = lazy_import("face_recognition")
+
+
+# Helper function to convert base64 image to numpy array
+def base64_to_image(base64_string):
+    try:
+        # Remove metadata from base64 string if present
+        base64_string = base64_string.split(",")[-1]
+        image_data = base64.b64decode(base64_string)
+        np_arr = np.frombuffer(image_data, np.uint8)
+        image = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+
+        if image is None:
+            raise ValueError("Decoded image is None")
+
+        return image
+    except Exception as e:
+        raise ValueError(f"Error converting Base64 to image: {str(e)}")
+
+
+_buffers = threading.local()
+
+
+# Read an upload stream into this thread's reusable buffer, growing it as needed.
+# The returned view is only valid until the next call in the same thread.
+def read_stream(stream):
+    buffer = getattr(_buffers, "buffer", None) or bytearray(1 << 20)
+    size = 0
+    while True:
+        if size == len(buffer):
+            grown = bytearray(2 * len(buffer))
+            grown[:size] = buffer
+            buffer = grown
+        with memoryview(buffer) as view:
+            count = stream.readinto(view[size:])
+        if not count:
+            break
+        size += count
+    _buffers.buffer = buffer
+    return memoryview(buffer)[:size]
+
+
+# Decode raw encoded image bytes (JPEG, PNG...) without copying them
+def bytes_to_image(data):
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Error decoding image: unsupported or corrupt image data")
+    return image
+
+
+# A frame is a base64 string (JSON uploads), encoded image bytes, or a binary
+# upload stream (multipart file or raw request body)
+def decode_image(frame):
+    with stage("decode"):
+        return _decode_image(frame)
+
+
+def _decode_image(frame):
+    if isinstance(frame, str):
+        return base64_to_image(frame)
+    if isinstance(frame, (bytes, bytearray, memoryview)):
+        return bytes_to_image(frame)
+    with read_stream(frame) as data:
+        return bytes_to_image(data)
+
+
+# Upload streams can't cross process boundaries, worker processes get their bytes
+def transferable_frame(frame):
+    if isinstance(frame, (str, bytes)):
+        return frame
+    if isinstance(frame, (bytearray, memoryview)):
+        return bytes(frame)
+    return frame.read()
+
+
+# Detection settings: run HOG on a copy downscaled by "scale" and drop faces
+# smaller than "min_face_size" pixels (measured at full resolution)
+DEFAULT_DETECTION = {"scale": 1.0, "min_face_size": 0}
+
+
+# Find faces on a downscaled copy of a BGR frame and map the boxes back to full
+# resolution. Returns face_recognition (top, right, bottom, left) boxes.
+def detect_faces(image, scale=1.0, min_face_size=0):
+    with stage("detect"):
+        return _detect_faces(image, scale, min_face_size)
+
+
+def _detect_faces(image, scale, min_face_size):
+    height, width = image.shape[:2]
+    if scale < 1.0:
+        small = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    else:
+        small, scale = image, 1.0
+    small_locations = face_recognition.face_locations(cv2.cvtColor(small, cv2.COLOR_BGR2RGB))
+
+    face_locations = []
+    for top, right, bottom, left in small_locations:
+        top, right = max(0, int(top / scale)), min(width, int(round(right / scale)))
+        bottom, left = min(height, int(round(bottom / scale))), max(0, int(left / scale))
+        if min(bottom - top, right - left) >= min_face_size:
+            face_locations.append((top, right, bottom, left))
+    return face_locations
+
+
+# Stored encodings are L2-normalized when FACE_ENCODING_NORMALIZE=1 (see face_codec),
+# so probes are normalized the same way to be compared on the same scale
+NORMALIZE_ENCODINGS = os.getenv("FACE_ENCODING_NORMALIZE", "0") == "1"
+
+
+# Encode each face from a full-resolution crop around its box, so only face
+# regions are converted and passed to the landmark and encoding models
+def encode_faces(image, face_locations):
+    with stage("encode"):
+        return _encode_faces(image, face_locations)
+
+
+def _encode_faces(image, face_locations):
+    height, width = image.shape[:2]
+    face_encodings = []
+    for top, right, bottom, left in face_locations:
+        margin = (bottom - top) // 4
+        crop_top, crop_left = max(0, top - margin), max(0, left - margin)
+        crop = image[crop_top:min(height, bottom + margin), crop_left:min(width, right + margin)]
+        rgb_crop = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        box = (top - crop_top, right - crop_left, bottom - crop_top, left - crop_left)
+        encoding = face_recognition.face_encodings(rgb_crop, [box])[0]
+        if NORMALIZE_ENCODINGS:
+            encoding = encoding / (np.linalg.norm(encoding) or 1.0)
+        face_encodings.append(encoding)
+    return face_encodings
+
+
+# Detect and encode every face of one frame.
+# Returns (face_locations, face_encodings).
+def encode_frame(frame, detection=None):
+    detection = dict(DEFAULT_DETECTION, **(detection or {}))
+    image_np = decode_image(frame)
+    face_locations = detect_faces(image_np, detection["scale"], detection["min_face_size"])
+    face_encodings = encode_faces(image_np, face_locations)
+    return face_locations, face_encodings
+
+
+# Cheap appearance descriptor of a face: a normalized 16x16 grayscale thumbnail,
+# compared by dot product (normalized cross-correlation)
+def face_appearance(image, location):
+    top, right, bottom, left = location
+    crop = cv2.cvtColor(image[top:bottom, left:right], cv2.COLOR_BGR2GRAY)
+    thumb = cv2.resize(crop, (16, 16), interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+    thumb -= thumb.mean()
+    return thumb / (np.linalg.norm(thumb) + 1e-6)
+
+
+# Detect the faces of one frame and encode only those that can't be associated
+# with one of the given confirmed tracks. Returns one dict per face with "box",
+# "appearance" and either "track_id" or "encoding".
+def track_frame(frame, detection=None, tracks=None, iou_threshold=0.3, appearance_threshold=0.5):
+    detection = dict(DEFAULT_DETECTION, **(detection or {}))
+    image_np = decode_image(frame)
+    face_locations = detect_faces(image_np, detection["scale"], detection["min_face_size"])
+    with stage("track"):
+        appearances = [face_appearance(image_np, location) for location in face_locations]
+        assigned = associate(face_locations, appearances, tracks or [], iou_threshold, appearance_threshold)
+
+    to_encode = [i for i in range(len(face_locations)) if i not in assigned]
+    encodings = dict(zip(to_encode, encode_faces(image_np, [face_locations[i] for i in to_encode])))
+
+    faces = []
+    for i, location in enumerate(face_locations):
+        face = {"box": location, "appearance": appearances[i]}
+        if i in assigned:
+            face["track_id"] = assigned[i]
+        else:
+            face["encoding"] = encodings[i]
+        faces.append(face)
+    return faces
+
+
+# Run the detector and encoder once so the dlib models are loaded before real work arrives
+def warm_up():
+    blank = np.zeros((64, 64, 3), dtype=np.uint8)
+    face_recognition.face_locations(blank)
+    face_recognition.face_encodings(blank, [(8, 56, 56, 8)])
+
+
+def _ping():
+    return True
+
+
+# Worker pool that detects and encodes frames outside the request threads.
+# With 0 workers frames are encoded inline in the calling thread.
+class FaceEncodingPool:
+    def __init__(self, workers=0, start_method="spawn"):
+        self.workers = workers
+        self.start_method = start_method
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._executor is None and self.workers > 0:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=warm_up
+                )
+                # Spawn every worker now so none pays the model loading cost on a request
+                for future in [self._executor.submit(_ping) for _ in range(self.workers)]:
+                    future.result()
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    # Encode several frames in parallel. Frames that fail to decode or encode
+    # are logged and come back as ([], []), so results stay aligned with images.
+    def encode_frames(self, images, detection=None):
+        executor = self.start()
+        if executor is None:
+            return [self._safe(([], []), encode_frame, image, detection) for image in images]
+
+        futures = [
+            executor.submit(collect_stages, encode_frame, transferable_frame(image), detection)
+            for image in images
+        ]
+        return [self._safe(([], []), self._result, future) for future in futures]
+
+    # Like encode_frames, but faces associated with a confirmed track are not
+    # re-encoded (see track_frame). Failed frames come back as [].
+    def track_frames(self, images, detection=None, tracks=None, **options):
+        executor = self.start()
+        if executor is None:
+            return [self._safe([], track_frame, image, detection, tracks, **options) for image in images]
+
+        futures = [
+            executor.submit(collect_stages, track_frame, transferable_frame(image), detection, tracks, **options)
+            for image in images
+        ]
+        return [self._safe([], self._result, future) for future in futures]
+
+    # Like encode_frames, but every frame comes back as (locations, encodings, error)
+    # with the error message of a failed frame, for callers that report failures
+    def try_encode_frames(self, images, detection=None):
+        executor = self.start()
+        if executor is None:
+            return [self._outcome(encode_frame, image, detection) for image in images]
+
+        futures = [
+            executor.submit(collect_stages, encode_frame, transferable_frame(image), detection)
+            for image in images
+        ]
+        return [self._outcome(self._result, future) for future in futures]
+
+    # Encode a single frame, raising any decode/encode error to the caller
+    def encode_frame(self, image, detection=None):
+        executor = self.start()
+        if executor is None:
+            return encode_frame(image, detection)
+        return self._result(executor.submit(collect_stages, encode_frame, transferable_frame(image), detection))
+
+    # Work submitted to the workers returns its stage timings with the result
+    # (see metrics.collect_stages); they are recorded here, where metrics are exported
+    @staticmethod
+    def _result(future):
+        result, stages = future.result()
+        record_stages(stages)
+        return result
+
+    @staticmethod
+    def _outcome(fn, *args):
+        try:
+            face_locations, face_encodings = fn(*args)
+            return face_locations, face_encodings, None
+        except Exception as e:
+            count(frames_total, outcome="error")
+            return [], [], str(e)
+
+    @staticmethod
+    def _safe(default, fn, *args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            traceback.print_exc()
+            count(frames_total, outcome="error")
+            return default
@@ -0,0 +1,32 @@
+import numpy as np
+
+from face_matching import distance_matrix
+
+
+TEMPLATE_METHODS = ("mean", "medoid")
+
+
+# Aggregate a student's encodings into one template: their mean, or the medoid
+# (the encoding closest to all the others, robust to one bad enrollment image)
+def aggregate_template(vectors, method="mean"):
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+    if method == "medoid" and len(vectors) > 2:
+        return vectors[distance_matrix(vectors, vectors).sum(axis=1).argmin()]
+    return vectors.mean(axis=0)
+
+
+# The encodings kept for a student: the newest max_encodings of existing + new.
+# A new encoding equal to a kept one (the same image enrolled again, e.g. by a
+# resumed import) is not added twice.
+def merge_encodings(existing, new, max_encodings=5):
+    kept = list(existing)
+    for vector in new:
+        if not any(np.linalg.norm(np.asarray(vector) - other) < 1e-2 for other in kept):
+            kept.append(vector)
+    return kept[-max_encodings:]
+
+
+# Index of the largest face box, the one enrolled when an image has several faces
+def largest_face(face_locations):
+    areas = [(bottom - top) * (right - left) for top, right, bottom, left in face_locations]
+    return int(np.argmax(areas))
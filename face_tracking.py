@@ -0,0 +1,172 @@
+import itertools
+import threading
+import time
+
+import numpy as np
+
+
+def box_iou(a, b):
+    # face_recognition boxes are (top, right, bottom, left)
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, bottom - top) * max(0, right - left)
+    if not inter:
+        return 0.0
+    area = lambda box: (box[2] - box[0]) * (box[1] - box[3])
+    return inter / float(area(a) + area(b) - inter)
+
+
+def appearance_similarity(a, b):
+    return float(np.dot(a, b))
+
+
+# Associate detected boxes with known tracks, best IoU first, each track used once.
+# tracks is a list of {"track_id", "box", "appearance"}; appearances may be None
+# when not computed. Returns {face_index: track_id}.
+def associate(boxes, appearances, tracks, iou_threshold=0.3, appearance_threshold=0.5):
+    candidates = []
+    for i, box in enumerate(boxes):
+        for track in tracks:
+            iou = box_iou(box, track["box"])
+            if iou < iou_threshold:
+                continue
+            if appearances is not None and track.get("appearance") is not None and \
+                    appearance_similarity(appearances[i], track["appearance"]) < appearance_threshold:
+                continue
+            candidates.append((iou, i, track["track_id"]))
+
+    assigned = {}
+    used_tracks = set()
+    for iou, i, track_id in sorted(candidates, reverse=True):
+        if i in assigned or track_id in used_tracks:
+            continue
+        assigned[i] = track_id
+        used_tracks.add(track_id)
+    return assigned
+
+
+class Track:
+    def __init__(self, track_id, box, appearance):
+        self.track_id = track_id
+        self.box = box
+        self.appearance = appearance
+        self.student_id = None
+        self.distance = None
+        self.confirmed = False
+        self.skipped = 0  # associations since the last encoding
+        self.last_seen = time.monotonic()
+
+
+# Follows the faces of one attendance session (teacher, subject, date) across
+# frames and batches. Confirmed tracks are associated by box overlap and
+# appearance instead of being re-encoded, and are re-verified every
+# reverify_every associations.
+class FaceTracker:
+    def __init__(self, iou_threshold=0.3, appearance_threshold=0.5, reverify_every=20, max_age=60.0):
+        self.iou_threshold = iou_threshold
+        self.appearance_threshold = appearance_threshold
+        self.reverify_every = reverify_every
+        self.max_age = max_age  # seconds an unseen track is kept
+        self.tracks = {}
+        self.encoded_faces = 0
+        self.tracked_faces = 0
+        self.last_used = time.monotonic()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    # Confirmed tracks that may skip encoding in the next frames
+    def snapshot(self):
+        with self._lock:
+            self.last_used = time.monotonic()
+            self._prune()
+            return [
+                {"track_id": t.track_id, "box": t.box, "appearance": t.appearance}
+                for t in self.tracks.values()
+                if t.confirmed and t.skipped < self.reverify_every
+            ]
+
+    def student_for(self, track_id):
+        with self._lock:
+            track = self.tracks.get(track_id)
+            return (track.student_id, track.distance) if track and track.confirmed else (None, None)
+
+    # faces is one list per frame, in frame order, of dicts with "box",
+    # "appearance", "track_id" (face associated without encoding) or
+    # "student_id"/"distance" (face encoded, student_id None when unmatched)
+    def update(self, frames):
+        with self._lock:
+            now = time.monotonic()
+            for faces in frames:
+                tracked = {face["track_id"] for face in faces if face.get("track_id")}
+                encoded = [face for face in faces if not face.get("track_id")]
+
+                for face in faces:
+                    track = self.tracks.get(face.get("track_id"))
+                    if track:
+                        track.box = face["box"]
+                        track.skipped += 1
+                        track.last_seen = now
+                        self.tracked_faces += 1
+
+                # Encoded faces refresh the track they overlap (re-verification) or start a new one
+                open_tracks = [
+                    {"track_id": t.track_id, "box": t.box, "appearance": None}
+                    for t in self.tracks.values() if t.track_id not in tracked
+                ]
+                matches = associate([face["box"] for face in encoded], None, open_tracks, self.iou_threshold)
+                for i, face in enumerate(encoded):
+                    track = self.tracks.get(matches.get(i))
+                    if track is None:
+                        track = Track(next(self._ids), face["box"], face["appearance"])
+                        self.tracks[track.track_id] = track
+                    track.box = face["box"]
+                    track.appearance = face["appearance"]
+                    track.student_id = face.get("student_id")
+                    track.distance = face.get("distance")
+                    track.confirmed = track.student_id is not None
+                    track.skipped = 0
+                    track.last_seen = now
+                    self.encoded_faces += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tracks": len(self.tracks),
+                "confirmed": sum(1 for t in self.tracks.values() if t.confirmed),
+                "encoded_faces": self.encoded_faces,
+                "tracked_faces": self.tracked_faces
+            }
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.max_age
+        for track_id in [t.track_id for t in self.tracks.values() if t.last_seen < cutoff]:
+            del self.tracks[track_id]
+
+
+# Trackers of the live sessions, keyed by (teacher_id, subject_id, date). Idle
+# sessions are dropped after idle_timeout seconds.
+class TrackerRegistry:
+    def __init__(self, idle_timeout=900.0, **tracker_options):
+        self.idle_timeout = idle_timeout
+        self.tracker_options = tracker_options
+        self._trackers = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            cutoff = time.monotonic() - self.idle_timeout
+            for stale in [k for k, t in self._trackers.items() if t.last_used < cutoff]:
+                del self._trackers[stale]
+            tracker = self._trackers.get(key)
+            if tracker is None:
+                tracker = self._trackers[key] = FaceTracker(**self.tracker_options)
+            return tracker
+
+    def discard(self, key):
+        with self._lock:
+            self._trackers.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            trackers = list(self._trackers.items())
+        return {"|".join(key): tracker.stats() for key, tracker in trackers}
@@ -0,0 +1,147 @@
+import base64
+import collections
+import threading
+import time
+
+import numpy as np
+
+from vision import lazy_import
+
+cv2 = lazy_import("cv2")
+
+
+# Thresholds, measured on the quarter-resolution grayscale decode of a frame:
+# min_sharpness is the variance of its Laplacian, brightness its mean gray level
+# (0-255) and min_change the mean absolute gray-level difference from the
+# previous accepted frame of the same session
+DEFAULT_QUALITY = {
+    "min_sharpness": 40.0,
+    "min_brightness": 40.0,
+    "max_brightness": 220.0,
+    "min_change": 2.0
+}
+
+REJECT_REASONS = ("unreadable", "dark", "bright", "blurry", "duplicate")
+
+
+# Encoded bytes of a frame, whatever the upload format. Streams are read here,
+# so the bytes are what is passed on to the encoders.
+def frame_bytes(frame):
+    if isinstance(frame, str):
+        return base64.b64decode(frame.split(",")[-1])
+    if isinstance(frame, (bytes, bytearray, memoryview)):
+        return bytes(frame)
+    return frame.read()
+
+
+# Quarter-resolution grayscale decode; for JPEG, libjpeg scales while decoding so
+# this costs a fraction of a full decode
+def quality_thumbnail(data):
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+
+
+def measure(thumb, previous=None):
+    metrics = {
+        "brightness": float(thumb.mean()),
+        "sharpness": float(cv2.Laplacian(thumb, cv2.CV_64F).var()),
+        "change": None
+    }
+    if previous is not None:
+        small = cv2.resize(thumb, (64, 48), interpolation=cv2.INTER_AREA)
+        metrics["change"] = float(cv2.absdiff(small, previous).mean())
+    return metrics
+
+
+def reject_reason(metrics, settings):
+    if metrics["brightness"] < settings["min_brightness"]:
+        return "dark"
+    if metrics["brightness"] > settings["max_brightness"]:
+        return "bright"
+    if metrics["sharpness"] < settings["min_sharpness"]:
+        return "blurry"
+    if metrics["change"] is not None and metrics["change"] < settings["min_change"]:
+        return "duplicate"
+    return None
+
+
+# Drops unusable and near-identical frames before face detection. The previous
+# accepted frame is remembered per session key; sessions idle for idle_timeout
+# seconds are forgotten. The first usable frame of a batch is never dropped as a
+# duplicate, so a static classroom is still looked at once per batch and late
+# arrivals are seen. Counters and recent measurements are kept for tuning.
+class FrameGate:
+    def __init__(self, settings=None, history=500, idle_timeout=900.0):
+        self.settings = dict(DEFAULT_QUALITY, **(settings or {}))
+        self.idle_timeout = idle_timeout
+        self.frames = 0
+        self.accepted = 0
+        self.rejected = dict.fromkeys(REJECT_REASONS, 0)
+        self.recent = {name: collections.deque(maxlen=history) for name in ("brightness", "sharpness", "change")}
+        self._previous = {}  # key -> (small thumbnail, last_used)
+        self._lock = threading.Lock()
+
+    # Returns (frames to process, as bytes, and [{"index", "reason"}] of the skipped ones)
+    def filter(self, key, frames):
+        kept = []
+        skipped = []
+        with self._lock:
+            self._expire()
+            previous = self._previous.get(key, (None, 0))[0]
+
+        for i, frame in enumerate(frames):
+            data = frame_bytes(frame)
+            thumb = quality_thumbnail(data)
+            if thumb is None:
+                reason = "unreadable"
+            else:
+                metrics = measure(thumb, previous)
+                reason = reject_reason(metrics, self.settings)
+                if reason == "duplicate" and not kept:
+                    reason = None
+                self._record(metrics)
+
+            if reason:
+                skipped.append({"index": i, "reason": reason})
+            else:
+                kept.append(data)
+                previous = cv2.resize(thumb, (64, 48), interpolation=cv2.INTER_AREA)
+
+        with self._lock:
+            self.frames += len(frames)
+            self.accepted += len(kept)
+            for skip in skipped:
+                self.rejected[skip["reason"]] += 1
+            if previous is not None:
+                self._previous[key] = (previous, time.monotonic())
+        return kept, skipped
+
+    def forget(self, key):
+        with self._lock:
+            self._previous.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            recent = {}
+            for name, values in self.recent.items():
+                values = [v for v in values if v is not None]
+                if values:
+                    p10, p50, p90 = np.percentile(values, [10, 50, 90])
+                    recent[name] = {"p10": round(float(p10), 2), "p50": round(float(p50), 2),
+                                    "p90": round(float(p90), 2)}
+            return {
+                "settings": self.settings,
+                "frames": self.frames,
+                "accepted": self.accepted,
+                "rejected": dict(self.rejected),
+                "recent": recent
+            }
+
+    def _record(self, metrics):
+        with self._lock:
+            for name, value in metrics.items():
+                self.recent[name].append(value)
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        for key in [k for k, (_, used) in self._previous.items() if used < cutoff]:
+            del self._previous[key]
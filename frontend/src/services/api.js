@@ -68,12 +68,18 @@ export async function markBatchAttendanceAPI(attendanceBatch) {
 
 
 // Mark attendance in batch (for multiple students at once)
+// Frames are uploaded as binary JPEG files, a third smaller than base64 in JSON
 export async function markBatchFacialAttendanceAPI(attendanceBatch) {
   try {
+    const { images, ...fields } = attendanceBatch;
+    const formData = new FormData();
+    Object.entries(fields).forEach(([key, value]) => formData.append(key, value));
+    const blobs = await Promise.all(images.map(image => fetch(image).then(res => res.blob())));
+    blobs.forEach((blob, i) => formData.append('images', blob, `frame${i}.jpg`));
+
     const response = await fetch('http://localhost:5000/api/attendance/batch_facial', {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify(attendanceBatch)
+      body: formData
     });
     return await response.json();
   } catch (error) {
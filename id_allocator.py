@@ -0,0 +1,111 @@
+import threading
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+# Sequence name -> (prefix, minimum digits, collection, id field). The digits
+# are a minimum: S99999 is followed by S100000.
+ID_SEQUENCES = {
+    "student": ("S", 5, "students", "student_id"),
+    "teacher": ("T", 3, "teachers", "teacher_id"),
+    "subject": ("B", 3, "subjects", "subject_id"),
+}
+
+
+def format_id(prefix, width, number):
+    return f"{prefix}{number:0{width}d}"
+
+
+def parse_id(prefix, value):
+    if isinstance(value, str) and value.startswith(prefix) and value[len(prefix):].isdigit():
+        return int(value[len(prefix):])
+    return None
+
+
+# Highest number in use. IDs sort as strings (S100000 before S99999), so they
+# are all read and compared as numbers; the projection is covered by the
+# unique id index.
+def highest_id(collection, field, prefix):
+    highest = 0
+    for doc in collection.find({field: {"$regex": f"^{prefix}[0-9]+$"}}, {"_id": 0, field: 1}):
+        number = parse_id(prefix, doc.get(field))
+        if number is not None and number > highest:
+            highest = number
+    return highest
+
+
+# Hands out IDs from one counter document per sequence ({"_id": name, "value":
+# last number issued}). An $inc is atomic, so concurrent requests and processes
+# never receive the same ID, and a block of any size costs one round trip.
+# Numbers of a block that is not used are skipped, never reissued.
+class IdAllocator:
+    def __init__(self, db, collection="counters", sequences=ID_SEQUENCES):
+        self.db = db
+        self.counters = db[collection]
+        self.sequences = sequences
+        self._seeded = set()
+        self._lock = threading.Lock()
+
+    # The next `count` IDs of a sequence, in order
+    def allocate(self, name, count=1):
+        if count < 1:
+            raise ValueError("count must be at least 1")
+        prefix, width, _, _ = self.sequences[name]
+        self._ensure_seeded(name)
+        counter = self.counters.find_one_and_update(
+            {"_id": name},
+            {"$inc": {"value": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        last = counter["value"]
+        return [format_id(prefix, width, number) for number in range(last - count + 1, last + 1)]
+
+    def next_id(self, name):
+        return self.allocate(name)[0]
+
+    # Raise a counter to the highest ID in its collection, e.g. after records
+    # were imported with their own IDs. $max never lowers it, so this is safe to
+    # run while IDs are being allocated.
+    def sync(self, name):
+        prefix, _, collection, field = self.sequences[name]
+        highest = highest_id(self.db[collection], field, prefix)
+        try:
+            self.counters.update_one({"_id": name}, {"$max": {"value": highest}}, upsert=True)
+        except DuplicateKeyError:
+            # Another process created the counter at the same moment
+            self.counters.update_one({"_id": name}, {"$max": {"value": highest}})
+        return highest
+
+    # A missing counter is seeded from the existing records once per process
+    def _ensure_seeded(self, name):
+        if name in self._seeded:
+            return
+        with self._lock:
+            if name not in self._seeded:
+                if self.counters.find_one({"_id": name}, {"_id": 1}) is None:
+                    self.sync(name)
+                self._seeded.add(name)
+
+    def stats(self):
+        return {doc["_id"]: doc["value"] for doc in self.counters.find({"_id": {"$in": list(self.sequences)}})}
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from dotenv import load_dotenv
+    from db import mongo
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="ID counters")
+    parser.add_argument("command", choices=["show", "sync"],
+                        help="sync raises each counter to the highest ID in use")
+    args = parser.parse_args()
+
+    allocator = IdAllocator(mongo.db)
+    if args.command == "sync":
+        for name in allocator.sequences:
+            allocator.sync(name)
+    print(json.dumps(allocator.stats(), indent=2))
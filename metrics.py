@@ -0,0 +1,238 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from pymongo import monitoring
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, _format_labels(self.labels, key), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                yield self.name + "_bucket", _format_labels(self.labels, key, [("le", _format_value(bound))]), cumulative
+            yield self.name + "_bucket", _format_labels(self.labels, key, [("le", "+Inf")]), values[-1]
+            yield self.name + "_sum", _format_labels(self.labels, key), values[-2]
+            yield self.name + "_count", _format_labels(self.labels, key), values[-1]
+
+
+# A gauge read when the metrics are scraped: fn() returns a number, or a dict
+# of {label value tuple: number}
+class CallbackGauge:
+    kind = "gauge"
+
+    def __init__(self, name, help, fn, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.fn = fn
+
+    def samples(self):
+        values = self.fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            yield self.name, _format_labels(self.labels, key), value
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, fn, labels=()):
+        return self._add(CallbackGauge(name, help, fn, labels))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    # Prometheus text exposition format
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+enabled = True
+
+request_seconds = registry.histogram(
+    "http_request_duration_seconds", "Request latency by endpoint", ("endpoint", "method", "status"))
+request_db_commands = registry.histogram(
+    "http_request_db_commands", "MongoDB commands issued per request", ("endpoint",), COUNT_BUCKETS)
+stage_seconds = registry.histogram(
+    "pipeline_stage_duration_seconds", "Time spent in each stage of the facial pipelines", ("endpoint", "stage"))
+frames_total = registry.counter("face_frames_total", "Camera frames received", ("endpoint", "outcome"))
+faces_total = registry.counter("face_faces_total", "Faces detected", ("endpoint", "kind"))
+matches_total = registry.counter("face_matches_total", "Faces matched against the gallery", ("endpoint", "result"))
+db_command_seconds = registry.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency", ("command", "outcome"))
+
+
+# Per-thread state: the endpoint being served, its MongoDB command count, and
+# in pool workers the stage timings collected for the parent process
+_context = threading.local()
+
+
+def current_endpoint():
+    return getattr(_context, "endpoint", None) or "background"
+
+
+def begin_request(endpoint):
+    _context.endpoint = endpoint
+    _context.db_commands = 0
+    _context.started = time.perf_counter()
+
+
+def end_request(method, status):
+    started = getattr(_context, "started", None)
+    if started is None:
+        return
+    endpoint = current_endpoint()
+    request_seconds.observe(time.perf_counter() - started, endpoint=endpoint, method=method, status=status)
+    request_db_commands.observe(_context.db_commands, endpoint=endpoint)
+    _context.endpoint = None
+    _context.started = None
+
+
+# Label the metrics of work done outside a request, e.g. in a job worker thread
+@contextmanager
+def endpoint(name):
+    previous = getattr(_context, "endpoint", None)
+    _context.endpoint = name
+    try:
+        yield
+    finally:
+        _context.endpoint = previous
+
+
+def record_stage(name, seconds):
+    if not enabled:
+        return
+    collected = getattr(_context, "stages", None)
+    if collected is not None:
+        collected[name] = collected.get(name, 0.0) + seconds
+    else:
+        stage_seconds.observe(seconds, endpoint=current_endpoint(), stage=name)
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+# Runs fn in a pool worker and returns (result, {stage: seconds}), so the
+# parent process can record the stage timings of the work it handed out
+def collect_stages(fn, *args, **kwargs):
+    _context.stages = {}
+    try:
+        return fn(*args, **kwargs), _context.stages
+    finally:
+        _context.stages = None
+
+
+def record_stages(stages):
+    for name, seconds in stages.items():
+        record_stage(name, seconds)
+
+
+def count(counter, amount=1, **labels):
+    if enabled and amount:
+        counter.inc(amount, endpoint=current_endpoint(), **labels)
+
+
+# Counts the MongoDB commands of the current request and times every command.
+# pymongo publishes command events in the thread that runs the command.
+class CommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        if enabled and getattr(_context, "started", None) is not None:
+            _context.db_commands += 1
+
+    def succeeded(self, event):
+        if enabled:
+            db_command_seconds.observe(event.duration_micros / 1e6, command=event.command_name, outcome="ok")
+
+    def failed(self, event):
+        if enabled:
+            db_command_seconds.observe(event.duration_micros / 1e6, command=event.command_name, outcome="error")
@@ -0,0 +1,141 @@
+import datetime
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+
+# Indexes every collection needs: (keys, options)
+INDEXES = {
+    "attendance": [
+        ([("student_id", ASCENDING), ("subject_id", ASCENDING), ("date", ASCENDING)],
+         {"name": "student_subject_date", "unique": True}),
+        # Keyset pagination of GET /api/attendance walks (date, _id) under each filter
+        ([("subject_id", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)], {"name": "subject_date_id"}),
+        ([("student_id", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)], {"name": "student_date_id"}),
+        ([("date", DESCENDING), ("_id", DESCENDING)], {"name": "date_id"}),
+    ],
+    "students": [
+        ([("student_id", ASCENDING)], {"name": "student_id", "unique": True}),
+        ([("course", ASCENDING), ("class_year", ASCENDING), ("division", ASCENDING), ("face_registered", ASCENDING)],
+         {"name": "course_year_division_face"}),
+        ([("course", ASCENDING), ("class_year", ASCENDING), ("face_registered", ASCENDING)],
+         {"name": "course_year_face"}),
+    ],
+    "teachers": [
+        ([("teacher_id", ASCENDING)], {"name": "teacher_id", "unique": True}),
+    ],
+    "subjects": [
+        ([("subject_id", ASCENDING)], {"name": "subject_id", "unique": True}),
+        ([("teacher_id", ASCENDING)], {"name": "teacher_id"}),
+        ([("course", ASCENDING), ("class_year", ASCENDING)], {"name": "course_year"}),
+    ],
+    "attendance_summary_student": [
+        ([("student_id", ASCENDING), ("subject_id", ASCENDING)], {"name": "student_subject", "unique": True}),
+        ([("subject_id", ASCENDING), ("student_id", ASCENDING)], {"name": "subject_student"}),
+    ],
+    "attendance_summary_daily": [
+        ([("subject_id", ASCENDING), ("date", ASCENDING)], {"name": "subject_date", "unique": True}),
+    ],
+    "admins": [
+        ([("username", ASCENDING)], {"name": "username", "unique": True}),
+    ],
+}
+
+
+# Create any missing index. An index that cannot be built (e.g. a unique index
+# over existing duplicates) is reported and skipped so the server still starts.
+def ensure_indexes(db):
+    failed = []
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                db[collection].create_index(keys, **options)
+            except OperationFailure as e:
+                failed.append((collection, options["name"], str(e)))
+                print(f"Could not create index {collection}.{options['name']}: {e}")
+    return failed
+
+
+# GET /api/attendance pages newest first
+ATTENDANCE_SORT = [("date", -1), ("_id", -1)]
+
+
+# Representative queries issued by the endpoints: (endpoint, collection, filter, sort)
+def audit_queries():
+    date = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return [
+        ("login", "students", {"student_id": "S00001"}, None),
+        ("login", "teachers", {"teacher_id": "T001"}, None),
+        ("login", "admins", {"username": "admin"}, None),
+        ("generate_student_id", "counters", {"_id": "student"}, None),
+        ("get_students", "students", {"course": "BSC IT", "class_year": "FY", "division": "A"}, None),
+        ("get_teacher_subjects", "subjects", {"teacher_id": "T001"}, None),
+        ("get_student_subjects", "subjects", {"course": "BSC IT", "class_year": "FY"}, None),
+        ("view_attendance", "students", {"course": "BSC IT", "class_year": "FY", "division": "A"}, None),
+        ("view_attendance", "attendance",
+         {"student_id": {"$in": ["S00001", "S00002"]}, "subject_id": "B001", "date": date}, None),
+        ("view_attendance_range", "students", {"course": "BSC IT", "class_year": "FY", "division": "A"}, None),
+        ("view_attendance_range", "attendance",
+         {"student_id": {"$in": ["S00001", "S00002"]}, "subject_id": "B001", "date": {"$gte": date, "$lte": date}},
+         None),
+        ("batch_facial", "students", {"course": "BSC IT", "class_year": "FY", "face_registered": True}, None),
+        ("mark_attendance", "attendance", {"student_id": "S00001", "subject_id": "B001", "date": date}, None),
+        # The day sheet is one bulk upsert keyed like mark_attendance above
+        ("mark_all_absent", "students", {"course": "BSC IT", "class_year": "FY"}, None),
+        ("get_attendance", "attendance", {}, ATTENDANCE_SORT),
+        ("get_attendance", "attendance", {"subject_id": "B001"}, ATTENDANCE_SORT),
+        ("get_attendance", "attendance", {"student_id": "S00001"}, ATTENDANCE_SORT),
+    ]
+
+
+def _stages(plan):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+# Explain every endpoint query and report the ones whose winning plan is a
+# COLLSCAN or sorts in memory (a blocking SORT stage)
+def audit(db):
+    report = []
+    for endpoint, collection, query, sort in audit_queries():
+        command = {"find": collection, "filter": query}
+        if sort:
+            command["sort"] = dict(sort)
+        explain = db.command("explain", command, verbosity="queryPlanner")
+        stages = [stage for stage in _stages(explain["queryPlanner"]["winningPlan"]) if stage]
+        report.append({
+            "endpoint": endpoint,
+            "collection": collection,
+            "filter": query,
+            "sort": sort,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+            "blocking_sort": "SORT" in stages
+        })
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from dotenv import load_dotenv
+    from db import mongo
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Create the attendance indexes or audit endpoint query plans")
+    parser.add_argument("command", choices=["ensure", "audit"])
+    args = parser.parse_args()
+
+    if args.command == "ensure":
+        sys.exit(1 if ensure_indexes(mongo.db) else 0)
+
+    report = audit(mongo.db)
+    for entry in report:
+        flag = "COLLSCAN" if entry["collscan"] else "SORT" if entry["blocking_sort"] else "ok"
+        print(f"{flag:8} {entry['endpoint']:22} {entry['collection']:11} {' > '.join(entry['stages'])}")
+    sys.exit(1 if any(entry["collscan"] or entry["blocking_sort"] for entry in report) else 0)
@@ -0,0 +1,84 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from attendance_session import AttendanceSession, SessionRegistry
+
+ROSTER = {sid: {"student_id": sid} for sid in ("S00001", "S00002", "S00003", "S00004")}
+
+
+class Writer:
+    def __init__(self):
+        self.calls = []
+        self.fail = False
+
+    def __call__(self, records, students, overwrite):
+        if self.fail:
+            raise RuntimeError("write failed")
+        self.calls.append((sorted(records), overwrite))
+        return {sid: "inserted" for sid, _ in records}
+
+
+def session(writer, **options):
+    # A long interval keeps the background flush out of the tests
+    return AttendanceSession("T001:B001:2024-01-15", "gallery", ROSTER, writer, flush_interval=3600, **options)
+
+
+def test_present_marks_are_buffered_and_written_in_one_flush():
+    writer = Writer()
+    live = session(writer, present=["S00004"])
+
+    assert live.begin_batch() == ("gallery", frozenset({"S00004"}))
+    assert live.mark_present({"S00001": ROSTER["S00001"], "S00004": ROSTER["S00004"]}) == ["S00001"]
+    assert live.mark_present({"S00001": ROSTER["S00001"], "S00002": ROSTER["S00002"]}) == ["S00002"]
+    assert live.mark_present({"S00002": ROSTER["S00002"]}) == []
+    assert writer.calls == []
+
+    assert live.flush() == 2
+    assert writer.calls == [([("S00001", "present"), ("S00002", "present")], True)]
+    assert live.flush() == 0
+    assert live.status()["remaining"] == 1
+
+
+def test_a_failed_flush_keeps_the_marks_for_the_next_one():
+    writer = Writer()
+    live = session(writer)
+    live.mark_present({"S00001": ROSTER["S00001"]})
+
+    writer.fail = True
+    with pytest.raises(RuntimeError):
+        live.flush()
+    writer.fail = False
+    assert live.flush() == 1
+    assert writer.calls == [([("S00001", "present")], True)]
+
+
+def test_close_flushes_and_marks_the_unseen_roster_absent():
+    writer = Writer()
+    live = session(writer, present=["S00004"])
+    live.mark_present({"S00001": ROSTER["S00001"]})
+
+    status = live.close()
+    assert writer.calls == [
+        ([("S00001", "present")], True),
+        ([("S00002", "absent"), ("S00003", "absent")], False)
+    ]
+    assert (status["closed"], status["present"], status["marked_absent"]) == (True, 2, 2)
+    # Marks arriving after the close are left to the caller
+    assert live.mark_present({"S00002": ROSTER["S00002"]}) is None
+
+
+def test_registry_stops_a_session_once():
+    writer = Writer()
+    registry = SessionRegistry()
+
+    live, created = registry.start("key", lambda: session(writer))
+    assert created
+    assert registry.start("key", lambda: session(writer)) == (live, False)
+    assert registry.stop("key")["closed"]
+    assert registry.get("key") is None
+    assert registry.stop("key") is None
@@ -0,0 +1,107 @@
+import datetime
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from attendance_store import cursor_filter, encode_cursor, open_day_sheet, write_attendance
+from schema import ATTENDANCE_SORT
+
+mongomock = pytest.importorskip("mongomock")
+
+SUBJECT = {"subject_id": "B001", "name": "Maths", "course": "BSC IT", "class_year": "FY"}
+DATE = datetime.datetime(2024, 1, 15)
+
+
+# mongomock numbers the upserts of a bulk write by their count rather than by
+# the index of their operation, as MongoDB does, so the tests below list new
+# students before existing ones
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient().db
+    db.students.insert_many([
+        {"student_id": f"S0000{i}", "name": f"Student {i}", "course": "BSC IT", "class_year": "FY", "division": "A"}
+        for i in (1, 2, 3)
+    ] + [{"student_id": "S00009", "name": "Other", "course": "BSC CS", "class_year": "FY", "division": "A"}])
+    return db
+
+
+def statuses(db):
+    return {record["student_id"]: record["status"] for record in db.attendance.find()}
+
+
+def test_write_attendance_reports_the_outcome_of_every_student(db):
+    first = write_attendance(db.attendance, db.students, SUBJECT, DATE, [("S00001", "present")], "T001")
+    assert first == {"S00001": "inserted"}
+
+    second = write_attendance(db.attendance, db.students, SUBJECT, DATE,
+                              [("S00002", "present"), ("S00001", "absent"), ("S99999", "present")], "T002")
+    assert second == {"S00001": "updated", "S00002": "inserted", "S99999": "not_found"}
+    assert statuses(db) == {"S00001": "absent", "S00002": "present"}
+
+    record = db.attendance.find_one({"student_id": "S00001"})
+    # Fields of the first write are kept, the status fields follow the last one
+    assert (record["marked_by"], record["updated_by"]) == ("T001", "T002")
+    assert (record["student_name"], record["subject_name"], record["division"]) == ("Student 1", "Maths", "A")
+
+
+def test_write_attendance_keeps_the_last_status_given_for_a_student(db):
+    outcome = write_attendance(db.attendance, db.students, SUBJECT, DATE,
+                               [("S00001", "present"), ("S00001", "absent")], "T001")
+    assert outcome == {"S00001": "inserted"}
+    assert statuses(db) == {"S00001": "absent"}
+
+
+def test_write_attendance_without_overwrite_only_creates_missing_records(db):
+    write_attendance(db.attendance, db.students, SUBJECT, DATE, [("S00001", "present")], "T001")
+
+    outcome = write_attendance(db.attendance, db.students, SUBJECT, DATE,
+                               [("S00002", "absent"), ("S00001", "absent")], "T001", overwrite=False)
+    assert outcome == {"S00001": "exists", "S00002": "inserted"}
+    assert statuses(db) == {"S00001": "present", "S00002": "absent"}
+
+
+def test_open_day_sheet_marks_the_class_absent_once(db):
+    write_attendance(db.attendance, db.students, SUBJECT, DATE, [("S00002", "present")], "T001")
+
+    assert open_day_sheet(db.attendance, db.students, SUBJECT, DATE, "T001") == (3, 2)
+    assert statuses(db) == {"S00001": "absent", "S00002": "present", "S00003": "absent"}
+    # Repeating it creates nothing
+    assert open_day_sheet(db.attendance, db.students, SUBJECT, DATE, "T001") == (3, 0)
+
+
+def pages(collection, size):
+    cursor = None
+    while True:
+        query = cursor_filter(cursor) if cursor else {}
+        page = list(collection.find(query).sort(ATTENDANCE_SORT).limit(size))
+        if not page:
+            return
+        yield [record["student_id"] for record in page]
+        cursor = encode_cursor(page[-1])
+
+
+def test_cursor_pages_walk_every_record_newest_first(db):
+    days = [datetime.datetime(2024, 1, day) for day in (10, 11, 12)]
+    for day in days:
+        db.attendance.insert_many([{"student_id": f"{day:%d}-{n}", "date": day} for n in range(2)])
+    # mark_all_absent used to store dates as strings
+    db.attendance.insert_many([{"student_id": "legacy-1", "date": "2024-01-09"},
+                               {"student_id": "legacy-2", "date": "2024-01-08"}])
+
+    walked = list(pages(db.attendance, 3))
+    assert [len(page) for page in walked] == [3, 3, 2]
+    assert sum(walked, []) == ["12-1", "12-0", "11-1", "11-0", "10-1", "10-0", "legacy-1", "legacy-2"]
+
+
+def test_cursor_after_a_legacy_string_date_stays_on_string_dates(db):
+    db.attendance.insert_many([{"student_id": "legacy-1", "date": "2024-01-09"},
+                               {"student_id": "legacy-2", "date": "2024-01-08"},
+                               {"student_id": "new", "date": DATE}])
+    legacy = db.attendance.find_one({"student_id": "legacy-1"})
+
+    after = db.attendance.find(cursor_filter(encode_cursor(legacy)))
+    assert [record["student_id"] for record in after] == ["legacy-2"]
@@ -0,0 +1,66 @@
+import datetime
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from attendance_store import open_day_sheet, write_attendance
+from attendance_summary import AttendanceSummary
+
+mongomock = pytest.importorskip("mongomock")
+
+SUBJECT = {"subject_id": "B001", "name": "Maths", "course": "BSC IT", "class_year": "FY"}
+
+
+def snapshot(summary):
+    students = sorted(summary.for_subject("B001"), key=lambda row: row["student_id"])
+    return students, summary.daily("B001")
+
+
+def test_incremental_counters_match_a_rebuild():
+    db = mongomock.MongoClient().db
+    db.students.insert_many([
+        {"student_id": f"S0000{i}", "name": f"Student {i}", "course": "BSC IT", "class_year": "FY", "division": "A"}
+        for i in (1, 2, 3)
+    ])
+    summary = AttendanceSummary(db)
+    monday, tuesday = datetime.datetime(2024, 1, 15), datetime.datetime(2024, 1, 16)
+
+    def write(date, records, **options):
+        write_attendance(db.attendance, db.students, SUBJECT, date, records, "T001", summary=summary, **options)
+
+    open_day_sheet(db.attendance, db.students, SUBJECT, monday, "T001", summary=summary)
+    write(monday, [("S00001", "present"), ("S00002", "present")])
+    write(monday, [("S00002", "absent")])
+    # Repeating a status changes no counter
+    write(monday, [("S00001", "present")])
+    write(tuesday, [("S00003", "present")])
+    write(tuesday, [("S00001", "absent"), ("S00003", "absent")], overwrite=False)
+
+    students, daily = snapshot(summary)
+    assert [(row["student_id"], row["present"], row["total"]) for row in students] == [
+        ("S00001", 1, 2), ("S00002", 0, 1), ("S00003", 1, 2)
+    ]
+    assert [(row["date"], row["present"], row["total"], row["percentage"]) for row in daily] == [
+        ("2024-01-15", 1, 3, 33.33), ("2024-01-16", 1, 2, 50.0)
+    ]
+
+    assert summary.rebuild() == (3, 2)
+    assert snapshot(summary) == (students, daily)
+
+
+def test_rebuild_counts_legacy_string_dates_with_the_same_day():
+    db = mongomock.MongoClient().db
+    db.attendance.insert_many([
+        {"student_id": "S00001", "subject_id": "B001", "date": datetime.datetime(2024, 1, 15), "status": "present"},
+        {"student_id": "S00002", "subject_id": "B001", "date": "2024-01-15", "status": "absent"},
+    ])
+    summary = AttendanceSummary(db)
+
+    assert summary.rebuild() == (2, 1)
+    assert summary.daily("B001") == [
+        {"subject_id": "B001", "date": "2024-01-15", "present": 1, "total": 2, "percentage": 50.0}
+    ]
@@ -0,0 +1,58 @@
+import os
+import pickle
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from face_codec import HEADER, decode_encoding, decode_matrix, encode_encoding, is_legacy
+
+
+def encoding(seed=0):
+    return np.random.default_rng(seed).normal(0.0, 0.09, 128)
+
+
+@pytest.mark.parametrize("dtype, atol", [("float32", 1e-7), ("float16", 1e-3), ("int8", 2e-3)])
+def test_round_trip(dtype, atol):
+    vector = encoding()
+    blob = encode_encoding(vector, dtype)
+
+    assert len(blob) == HEADER.size + 128 * np.dtype(dtype).itemsize
+    decoded = decode_encoding(blob)
+    assert decoded.dtype == np.float32
+    np.testing.assert_allclose(decoded, vector, atol=atol)
+
+
+def test_normalized_encodings_have_unit_length():
+    decoded = decode_encoding(encode_encoding(encoding(), "float16", normalize=True))
+    assert np.linalg.norm(decoded) == pytest.approx(1.0, abs=1e-3)
+
+
+def test_pickled_encodings_are_still_read():
+    vector = encoding()
+    blob = pickle.dumps(vector)
+
+    assert is_legacy(blob)
+    np.testing.assert_allclose(decode_encoding(blob), vector.astype(np.float32))
+
+
+def test_decode_matrix_mixes_formats():
+    vectors = [encoding(seed) for seed in range(3)]
+    blobs = [encode_encoding(vectors[0]), encode_encoding(vectors[1], "int8"), pickle.dumps(vectors[2])]
+
+    matrix = decode_matrix(blobs)
+    assert matrix.shape == (3, 128)
+    np.testing.assert_allclose(matrix, np.vstack(vectors), atol=2e-3)
+    np.testing.assert_array_equal(decode_matrix([encode_encoding(v) for v in vectors]),
+                                  np.vstack(vectors).astype(np.float32))
+    assert decode_matrix([]).shape == (0, 128)
+
+
+def test_unknown_versions_are_rejected():
+    blob = bytearray(encode_encoding(encoding()))
+    blob[2] = 9
+    with pytest.raises(ValueError):
+        decode_encoding(bytes(blob))
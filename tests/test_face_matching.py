@@ -0,0 +1,55 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from face_matching import assign_matches, distance_matrix, match_frames
+
+
+def test_distance_matrix_is_euclidean():
+    rng = np.random.default_rng(0)
+    probes, gallery = rng.normal(size=(3, 128)), rng.normal(size=(4, 128))
+
+    expected = np.linalg.norm(probes[:, None, :] - gallery[None, :, :], axis=2)
+    np.testing.assert_allclose(distance_matrix(probes, gallery), expected)
+    assert distance_matrix(np.empty((0, 128)), gallery).shape == (0, 4)
+
+
+def test_nearest_pairs_are_assigned_first_and_used_once():
+    distances = np.array([
+        [0.30, 0.20, 0.90],
+        [0.10, 0.25, 0.90],
+        [0.40, 0.45, 0.60],
+    ])
+    # Face 1 takes entry 0, face 0 then entry 1; face 2 has nothing left within tolerance
+    assert assign_matches(distances, tolerance=0.5) == [(1, 0, 0.10), (0, 1, 0.20)]
+    assert assign_matches(distances, tolerance=0.05) == []
+
+
+def test_match_frames_assigns_each_frame_separately():
+    rng = np.random.default_rng(1)
+    gallery = rng.normal(0.0, 0.09, size=(5, 128))
+    near = lambda row: gallery[row] + 0.001
+    frames = [[near(2), near(4)], [], [near(2), rng.normal(0.0, 0.09, 128) + 1.0]]
+
+    matches = match_frames(frames, gallery, tolerance=0.5)
+    assert [[(face, entry) for face, entry, _ in frame] for frame in matches] == [[(0, 2), (1, 4)], [], [(0, 2)]]
+    assert match_frames([[], []], gallery) == [[], []]
+
+
+def test_borderline_templates_are_rechecked_against_individual_encodings():
+    template = np.zeros((1, 128))
+    sample = np.zeros((1, 128))
+    sample[0, 0] = 1.0
+    probe = np.zeros(128)
+    probe[0] = 0.55
+
+    assert match_frames([[probe]], template, tolerance=0.5) == [[]]
+    matches = match_frames([[probe]], template, tolerance=0.5, samples=sample, sample_owner=np.array([0]),
+                           margin=0.08)
+    assert [(face, entry) for face, entry, _ in matches[0]] == [(0, 0)]
+    assert matches[0][0][2] == pytest.approx(0.45)
@@ -0,0 +1,62 @@
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from face_tracking import FaceTracker, associate, box_iou
+
+# (top, right, bottom, left)
+BOX = (100, 200, 200, 100)
+MOVED = (105, 210, 205, 110)
+ELSEWHERE = (300, 500, 400, 400)
+
+
+def appearance(seed):
+    vector = np.random.default_rng(seed).normal(size=32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_boxes_are_associated_by_overlap_and_appearance():
+    tracks = [{"track_id": 1, "box": BOX, "appearance": appearance(0)},
+              {"track_id": 2, "box": ELSEWHERE, "appearance": None}]
+
+    assert box_iou(BOX, BOX) == 1.0
+    assert box_iou(BOX, ELSEWHERE) == 0.0
+    assert associate([MOVED, ELSEWHERE], [appearance(0), appearance(1)], tracks) == {0: 1, 1: 2}
+    # A different face at the same place is not followed
+    assert associate([MOVED], [appearance(1)], tracks) == {}
+    # Each track is taken by its best overlap only
+    assert associate([MOVED, BOX], None, tracks[:1]) == {1: 1}
+
+
+def test_confirmed_tracks_skip_encoding_until_they_are_reverified():
+    tracker = FaceTracker(reverify_every=2)
+    tracker.update([[{"box": BOX, "appearance": appearance(0), "student_id": "S00001", "distance": 0.3}]])
+
+    snapshot = tracker.snapshot()
+    assert [track["track_id"] for track in snapshot] == [1]
+    assert tracker.student_for(1) == ("S00001", 0.3)
+
+    tracker.update([[{"box": MOVED, "appearance": appearance(0), "track_id": 1}]])
+    assert [track["box"] for track in tracker.snapshot()] == [MOVED]
+    tracker.update([[{"box": BOX, "appearance": appearance(0), "track_id": 1}]])
+    # Due for re-verification: the face has to be encoded again
+    assert tracker.snapshot() == []
+
+    tracker.update([[{"box": MOVED, "appearance": appearance(0), "student_id": "S00001", "distance": 0.25}]])
+    assert [track["track_id"] for track in tracker.snapshot()] == [1]
+    assert tracker.student_for(1) == ("S00001", 0.25)
+    assert tracker.stats() == {"tracks": 1, "confirmed": 1, "encoded_faces": 2, "tracked_faces": 2}
+
+
+def test_unrecognized_faces_are_tracked_but_never_skip_encoding():
+    tracker = FaceTracker()
+    tracker.update([[{"box": BOX, "appearance": appearance(0), "student_id": None, "distance": None},
+                     {"box": ELSEWHERE, "appearance": appearance(1), "student_id": "S00002", "distance": 0.4}]])
+
+    assert [track["box"] for track in tracker.snapshot()] == [ELSEWHERE]
+    assert tracker.student_for(1) == (None, None)
+    assert tracker.stats()["tracks"] == 2
@@ -0,0 +1,52 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from frame_quality import FrameGate
+
+cv2 = pytest.importorskip("cv2")
+
+
+def png(image):
+    return cv2.imencode(".png", image)[1].tobytes()
+
+
+def scene(seed):
+    # Textured enough to pass as sharp, of middling brightness
+    return png(np.random.default_rng(seed).integers(40, 216, size=(240, 320, 3), dtype=np.uint8))
+
+
+def test_first_usable_frame_of_a_batch_is_kept_even_if_unchanged():
+    gate = FrameGate()
+    still = scene(0)
+
+    kept, skipped = gate.filter("T001:B001:2024-01-15", [still, still, still])
+    assert kept == [still]
+    assert skipped == [{"index": 1, "reason": "duplicate"}, {"index": 2, "reason": "duplicate"}]
+
+    # The next batch of the same static classroom is still looked at once
+    kept, skipped = gate.filter("T001:B001:2024-01-15", [still, still])
+    assert kept == [still]
+    assert skipped == [{"index": 1, "reason": "duplicate"}]
+
+
+def test_unusable_frames_are_skipped_with_their_reason():
+    gate = FrameGate()
+    dark = png(np.full((240, 320, 3), 5, dtype=np.uint8))
+    flat = png(np.full((240, 320, 3), 128, dtype=np.uint8))
+
+    kept, skipped = gate.filter("key", [dark, b"not an image", flat, scene(1), scene(2)])
+    assert kept == [scene(1), scene(2)]
+    assert skipped == [
+        {"index": 0, "reason": "dark"},
+        {"index": 1, "reason": "unreadable"},
+        {"index": 2, "reason": "blurry"}
+    ]
+    stats = gate.stats()
+    assert (stats["frames"], stats["accepted"]) == (5, 2)
+    assert stats["rejected"] == {"unreadable": 1, "dark": 1, "bright": 0, "blurry": 1, "duplicate": 0}
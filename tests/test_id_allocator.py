@@ -0,0 +1,56 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from id_allocator import IdAllocator, highest_id
+
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+def test_first_allocation_is_seeded_from_existing_ids(db):
+    # S100000 sorts before S99999 as a string but is the highest number
+    db.students.insert_many([{"student_id": "S00007"}, {"student_id": "S99999"}, {"student_id": "S100000"},
+                             {"student_id": "imported"}])
+    allocator = IdAllocator(db)
+
+    assert allocator.next_id("student") == "S100001"
+    assert allocator.next_id("teacher") == "T001"
+    assert allocator.stats() == {"student": 100001, "teacher": 1}
+
+
+def test_blocks_are_consecutive_and_never_reissued(db):
+    allocator = IdAllocator(db)
+
+    assert allocator.allocate("subject", 3) == ["B001", "B002", "B003"]
+    assert allocator.allocate("subject") == ["B004"]
+    # Another process sharing the counter continues after it
+    assert IdAllocator(db).allocate("subject", 2) == ["B005", "B006"]
+    with pytest.raises(ValueError):
+        allocator.allocate("subject", 0)
+
+
+def test_sync_raises_the_counter_but_never_lowers_it(db):
+    allocator = IdAllocator(db)
+    allocator.allocate("teacher", 5)
+
+    db.teachers.insert_one({"teacher_id": "T042"})
+    assert allocator.sync("teacher") == 42
+    assert allocator.next_id("teacher") == "T043"
+
+    db.teachers.delete_many({})
+    assert allocator.sync("teacher") == 0
+    assert allocator.next_id("teacher") == "T044"
+
+
+def test_highest_id_ignores_other_prefixes(db):
+    db.students.insert_many([{"student_id": "S00003"}, {"student_id": "T009"}, {"student_id": "S12a"}])
+    assert highest_id(db.students, "student_id", "S") == 3
@@ -0,0 +1,109 @@
+import base64
+import io
+import os
+import sys
+import zipfile
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    pytest.importorskip("mongomock")
+
+    # Paths are read when server is first imported, MONGO_URI on first use
+    data = tmp_path_factory.mktemp("server")
+    with pytest.MonkeyPatch.context() as env:
+        env.setenv("MONGO_URI", "mongomock://")
+        env.setenv("ATTENDANCE_JOBS_DB", str(data / "jobs.sqlite3"))
+        env.setenv("FACE_INDEX_PATH", str(data / "face_index"))
+        env.setenv("ENROLLMENT_DIR", str(data / "enrollment"))
+        import server
+        yield server
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
+
+
+def zip_archive(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    buffer.seek(0)
+    return buffer
+
+
+# The enrollment queue creates its directory only once a job is stored, so
+# the upload itself must not rely on it being there
+def test_bulk_enrollment_upload_creates_the_enrollment_dir(server, client, tmp_path, monkeypatch):
+    enrollment_dir = str(tmp_path / "enrollment")
+    submitted = []
+    monkeypatch.setattr(server, "enrollment_dir", enrollment_dir)
+    monkeypatch.setattr(server.enrollment_jobs, "submit",
+                        lambda kind, payload, job_id: submitted.append((kind, payload, job_id)))
+
+    response = client.post("/api/students/faces/bulk", data={
+        "archive": (zip_archive({"S00001.jpg": b"not an image"}), "faces.zip")
+    }, content_type="multipart/form-data")
+
+    assert response.status_code == 202, response.get_json()
+    job_id = response.get_json()["job_id"]
+    assert [(kind, queued) for kind, _, queued in submitted] == [("enrollment", job_id)]
+    assert zipfile.is_zipfile(submitted[0][1]["source"])
+    assert os.path.exists(os.path.join(enrollment_dir, f"{job_id}.zip"))
+    assert os.path.exists(os.path.join(enrollment_dir, f"{job_id}.json"))
+
+
+def enrolled_class(server, client):
+    for name in ("students", "subjects", "attendance", "counters"):
+        server.db[name].delete_many({})
+    subject = client.post("/api/subjects", json={"name": "Maths", "course": "BSC IT", "class_year": "FY"}).get_json()
+    student = client.post("/api/students", json={"name": "Asha", "age": 20, "dob": "2005-01-01", "course": "BSC IT",
+                                                 "class_year": "FY", "division": "A"}).get_json()
+    encoding = np.full(128, 0.05)
+    server.students_collection.update_one({"student_id": student["student"]["student_id"]}, {"$set": {
+        "face_encoding": server.encode_encoding(encoding),
+        "face_registered": True
+    }})
+    server.face_gallery_cache.invalidate()
+    return subject["subject"]["subject_id"], encoding
+
+
+# A failed attendance write must fail the request, not report the matched
+# students as marked present
+def test_batch_facial_fails_when_attendance_cannot_be_written(server, client, monkeypatch):
+    subject_id, encoding = enrolled_class(server, client)
+    monkeypatch.setattr(server, "frame_quality_enabled", False)
+    monkeypatch.setattr(server, "face_tracking_enabled", False)
+    monkeypatch.setattr(server.encoding_pool, "track_frames",
+                        lambda images, *args, **kwargs: [[{"encoding": encoding}] for _ in images])
+
+    def write_attendance(*args, **kwargs):
+        raise RuntimeError("write failed")
+    monkeypatch.setattr(server, "write_attendance", write_attendance)
+
+    body = {"subject_id": subject_id, "teacher_id": "T00001", "date": "2024-01-15", "images": ["frame"]}
+    response = client.post("/api/attendance/batch_facial", json=body)
+    assert response.status_code == 500
+    assert response.get_json() == {"error": "write failed"}
+
+    # Raised from the job handler, so the queue marks the job failed
+    with pytest.raises(RuntimeError):
+        server.run_facial_batch_job({key: body[key] for key in ("subject_id", "teacher_id", "date", "images")})
+
+
+def test_register_face_rejects_an_image_that_cannot_be_decoded(server, client):
+    enrolled_class(server, client)
+    student_id = server.students_collection.find_one({})["student_id"]
+
+    response = client.post(f"/api/students/{student_id}/face",
+                           json={"image": "data:image/jpeg;base64," + base64.b64encode(b"not a jpeg").decode()})
+    assert response.status_code == 400
+    assert response.get_json()["error"].startswith("Invalid image")
@@ -0,0 +1,70 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from face_index import FlatIndex
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, process, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                return response.status == 200
+        except OSError:
+            time.sleep(0.5)
+    return False
+
+
+# Encoding pool workers are spawned and re-import the main script as
+# __mp_main__; they must not repeat the server's startup work
+def test_encoding_pool_starts_from_server_script_without_loading_the_index(tmp_path):
+    pytest.importorskip("mongomock")
+    pytest.importorskip("face_recognition")
+
+    index_path = str(tmp_path / "face_index")
+    index = FlatIndex()
+    index.add(["S00001"], np.zeros((1, index.dim)))
+    index.save(index_path)
+
+    port = free_port()
+    env = dict(
+        os.environ,
+        MONGO_URI="mongomock://",
+        FACE_WORKERS="2",
+        FACE_INDEX_PATH=index_path,
+        ATTENDANCE_JOBS_DB=str(tmp_path / "jobs.sqlite3"),
+        ENROLLMENT_DIR=str(tmp_path / "enrollment"),
+        PORT=str(port),
+        PYTHONUNBUFFERED="1"
+    )
+    process = subprocess.Popen([sys.executable, "server.py"], cwd=ROOT, env=env, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, text=True, start_new_session=True)
+    try:
+        # The pool is started, with every worker up, before the server listens
+        started = wait_for(f"http://127.0.0.1:{port}/api/health", process)
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        output = process.communicate(timeout=30)[0]
+
+    assert started, output
+    # Once, by the serving process; neither the reloader nor the workers load it
+    assert output.count("Loaded flat face index") == 1, output
@@ -0,0 +1,56 @@
+import importlib
+import sys
+import threading
+import time
+import traceback
+
+
+# Modules of the vision stack; face_recognition loads the dlib models when imported
+VISION_MODULES = ("cv2", "dlib", "face_recognition")
+
+
+# A module that is imported on first attribute access, so processes that never
+# touch the vision stack never pay for it. importlib.util.LazyLoader is not used
+# because it cannot defer extension modules such as cv2.
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
+def loaded_modules():
+    return {name: name in sys.modules for name in VISION_MODULES}
+
+
+# Import the vision stack and run the models once. Returns the seconds it took.
+def warm_up():
+    import face_pipeline
+
+    start = time.perf_counter()
+    face_pipeline.warm_up()
+    return time.perf_counter() - start
+
+
+# Warm up in a background thread so the server accepts requests meanwhile
+def warm_up_in_background():
+    def run():
+        try:
+            print(f"Vision models loaded in {warm_up():.2f}s")
+        except Exception:
+            traceback.print_exc()
+
+    thread = threading.Thread(target=run, name="vision-warm-up", daemon=True)
+    thread.start()
+    return thread